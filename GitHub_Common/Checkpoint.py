@@ -0,0 +1,69 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+
+class Checkpoint:
+    def __init__(self, store, prefix="checkpoint/"):
+        """
+        Records crawl progress in a state store (see GitHub_Common.StateStore)
+        so an interrupted run can be resumed: repos that were already written
+        and the pages fetched so far of paginated queries. Pages are stored
+        one per key so saving a page costs the same no matter how many came
+        before it.
+        """
+        self.store = store
+        self.prefix = prefix
+
+    def is_done(self, scope, item):
+        """
+        Returns: True if item was marked done in scope
+        """
+        return self.store.get(f"{self.prefix}done/{scope}/{item}") is not None
+
+    def mark_done(self, scope, item):
+        self.store.put(f"{self.prefix}done/{scope}/{item}", True)
+
+    def load_pages(self, scope):
+        """
+        Returns: tuple of (pages fetched so far, state saved with the last page)
+                 or ([], None) if nothing was saved for scope
+        """
+        meta = self.store.get(f"{self.prefix}pages/{scope}")
+        if meta is None:
+            return [], None
+        pages = [
+            self.store.get(f"{self.prefix}pages/{scope}#{index}")
+            for index in range(meta["pages"])
+        ]
+        return pages, meta["state"]
+
+    def save_page(self, scope, index, page, state):
+        """
+        Save page number index (counting from 0) of scope along with the state
+        needed to fetch the next one (a cursor or page number)
+        """
+        self.store.put(f"{self.prefix}pages/{scope}#{index}", page)
+        self.store.put(
+            f"{self.prefix}pages/{scope}", {"pages": index + 1, "state": state}
+        )
+
+    def clear_pages(self, scope):
+        """
+        Forget the saved pages of scope once the query has completed
+        """
+        meta = self.store.get(f"{self.prefix}pages/{scope}")
+        if meta is None:
+            return
+        self.store.delete(f"{self.prefix}pages/{scope}")
+        for index in range(meta["pages"]):
+            self.store.delete(f"{self.prefix}pages/{scope}#{index}")
@@ -0,0 +1,40 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class Collector:
+    def __init__(self, workers=1):
+        """
+        Fans per-repo fetches out over a bounded thread pool. Results are
+        handed back to the calling thread, which is the only one that writes,
+        so output layout and logging match the serial path.
+        """
+        self.workers = max(1, workers)
+
+    def run(self, items, fetch, write):
+        """
+        Call fetch(item) for every item and write(item, result) for each result
+        Returns: array of the values returned by write
+        """
+        written = []
+        if self.workers == 1:
+            for item in items:
+                written.append(write(item, fetch(item)))
+            return written
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(fetch, item): item for item in items}
+            for future in as_completed(futures):
+                written.append(write(futures[future], future.result()))
+        return written
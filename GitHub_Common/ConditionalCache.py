@@ -0,0 +1,195 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import boto3
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+
+def cache_key(url, token):
+    """
+    Entries are kept per token: tokens can see different repos and traffic,
+    so a token only revalidates bodies it fetched itself
+    Returns: cache key for url requested with token
+    """
+    digest = hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+    return f"{digest}:{url}"
+
+
+def entry_from_response(response):
+    """
+    Returns: cache entry for a 200 response that carries validators, else None
+    """
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if response.status_code != 200 or (etag is None and last_modified is None):
+        return None
+    return {
+        "etag": etag,
+        "last_modified": last_modified,
+        "link": response.headers.get("link"),
+        "body": response.text,
+    }
+
+
+def conditional_headers(entry, headers=None):
+    """
+    Returns: copy of headers with If-None-Match/If-Modified-Since for entry
+    """
+    request_headers = dict(headers or {})
+    if entry["etag"] is not None:
+        request_headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"] is not None:
+        request_headers["If-Modified-Since"] = entry["last_modified"]
+    return request_headers
+
+
+def response_from_entry(entry, url):
+    """
+    Rebuild the cached 200 response so a 304 can be handled like a fresh one
+    Returns: requests.Response
+    """
+    response = Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = "utf-8"
+    response._content = entry["body"].encode("utf-8")
+    response.headers = CaseInsensitiveDict()
+    if entry["link"] is not None:
+        response.headers["link"] = entry["link"]
+    return response
+
+
+class SQLiteConditionalCache:
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        """
+        Conditional request cache for the CLI stored in a local SQLite file.
+        The least recently used entries are evicted once the stored bodies
+        grow past max_bytes.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+              url TEXT PRIMARY KEY,
+              etag TEXT,
+              last_modified TEXT,
+              link TEXT,
+              body TEXT,
+              size INTEGER,
+              accessed REAL
+            )
+            """
+        )
+        self.db.commit()
+
+    def get(self, url):
+        """
+        Returns: cache entry for url or None
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT etag, last_modified, link, body FROM cache WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE cache SET accessed = ? WHERE url = ?", (time.time(), url)
+            )
+            self.db.commit()
+        return {"etag": row[0], "last_modified": row[1], "link": row[2], "body": row[3]}
+
+    def put(self, url, entry):
+        """
+        Store entry for url and evict old entries past max_bytes
+        """
+        size = len(entry["body"].encode("utf-8"))
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    entry["etag"],
+                    entry["last_modified"],
+                    entry["link"],
+                    entry["body"],
+                    size,
+                    time.time(),
+                ),
+            )
+            total = self.db.execute("SELECT SUM(size) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                self.evict(total)
+            self.db.commit()
+
+    def evict(self, total):
+        # caller holds the lock
+        rows = self.db.execute("SELECT url, size FROM cache ORDER BY accessed")
+        expired = []
+        for url, size in rows.fetchall():
+            if total <= self.max_bytes:
+                break
+            expired.append((url,))
+            total -= size
+        self.db.executemany("DELETE FROM cache WHERE url = ?", expired)
+
+
+class S3ConditionalCache:
+    def __init__(self, bucket_name, prefix="http-cache/", s3_client=None):
+        """
+        Conditional request cache for Lambda with one S3 object per URL so
+        concurrent invocations never overwrite each other's entries. Size is
+        bounded by the lifecycle rule on the prefix rather than in code.
+        """
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.s3_client = s3_client if s3_client is not None else boto3.client("s3")
+
+    def key(self, url):
+        return self.prefix + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def get(self, url):
+        """
+        Returns: cache entry for url or None
+        """
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=self.key(url)
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def put(self, url, entry):
+        """
+        Store entry for url
+        """
+        self.s3_client.put_object(
+            Bucket=self.bucket_name, Key=self.key(url), Body=json.dumps(entry)
+        )
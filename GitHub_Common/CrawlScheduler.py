@@ -0,0 +1,182 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import datetime
+import hashlib
+import threading
+
+from .Metrics import Metrics
+from .Records import as_dict, as_list
+
+# traffic: referrers, paths, views and clones, GitHub only keeps 14 days
+# stats: contents and the /stats/* endpoints, they only change with pushes
+# alerts: the v4 document of counts, languages and vulnerability alerts
+KINDS = ("traffic", "stats", "alerts")
+TIERS = ("hot", "warm", "cold", "archived")
+# days between crawls of each kind per tier. Traffic is crawled at least
+# every 13 days so its 14 daily view and clone buckets always overlap.
+INTERVALS = {
+    "traffic": {"hot": 1, "warm": 7, "cold": 13, "archived": 13},
+    "stats": {"hot": 1, "warm": 7, "cold": 30, "archived": 90},
+    "alerts": {"hot": 1, "warm": 3, "cold": 7, "archived": 30},
+}
+
+
+def parse_date(value):
+    """
+    Returns: the date of a YYYY-MM-DD or ISO 8601 timestamp string, or None
+    """
+    if not value:
+        return None
+    return datetime.datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+
+def alerts_fingerprint(response):
+    """
+    Returns: hash of the alert ids and dismissal dates in a v4 document
+    """
+    alerts = as_dict(
+        as_dict(as_dict(response.get("data")).get("organization")).get("repository")
+    ).get("vulnerabilityAlerts")
+    keys = sorted(
+        f"{edge['node'].get('id')}:{edge['node'].get('dismissedAt')}"
+        for edge in as_list(as_dict(alerts).get("edges"))
+    )
+    return hashlib.sha256("\n".join(keys).encode()).hexdigest()
+
+
+class CrawlScheduler:
+    def __init__(
+        self,
+        store,
+        intervals=None,
+        hot_days=7,
+        warm_days=90,
+        refresh_days=90,
+        metrics=None,
+    ):
+        """
+        Decides which kinds of data (see KINDS) are due for a repo today from
+        its activity, so idle repos are crawled less often than busy ones.
+        A repo is "archived", "hot" when it was pushed to in the last
+        hot_days, had traffic in its last crawl or its alerts changed in the
+        last hot_days, "warm" when pushed to in the last warm_days and "cold"
+        otherwise. Each kind has its own interval per tier. Stats are only
+        crawled again once the repo was pushed to, or after refresh_days.
+
+        store: GitHub_Common state store keeping when each repo was crawled
+               and what it looked like then
+        intervals: days between crawls per kind and tier, INTERVALS if None
+        metrics: shared GitHub_Common.Metrics counting the repos each kind
+                 was due or skipped for per tier
+        """
+        self.store = store
+        self.intervals = intervals if intervals is not None else INTERVALS
+        self.hot_days = hot_days
+        self.warm_days = warm_days
+        self.refresh_days = refresh_days
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.lock = threading.Lock()
+
+    def state_key(self, org, repo):
+        return f"schedule/{org}/{repo}"
+
+    def tier(self, repo_info, state, today):
+        """
+        Returns: the repo's tier, one of TIERS
+        """
+        if repo_info.get("isArchived"):
+            return "archived"
+        pushed = parse_date(repo_info.get("pushedAt"))
+        alerts_changed = parse_date(state.get("alerts_changed"))
+        if (
+            (pushed is not None and (today - pushed).days < self.hot_days)
+            or state.get("traffic_count", 0) > 0
+            or (
+                alerts_changed is not None
+                and (today - alerts_changed).days < self.hot_days
+            )
+        ):
+            return "hot"
+        if pushed is not None and (today - pushed).days < self.warm_days:
+            return "warm"
+        return "cold"
+
+    def due(self, org, repo_info, kinds=KINDS, today=None):
+        """
+        repo_info: repo dict from GitHub_Common.RepoInventory
+        kinds: the kinds to consider
+        Returns: set of the kinds due for the repo today
+        """
+        if today is None:
+            today = datetime.date.today()
+        state = self.store.get(self.state_key(org, repo_info["name"])) or {}
+        tier = self.tier(repo_info, state, today)
+        pushed = parse_date(repo_info.get("pushedAt"))
+        due = set()
+        for kind in kinds:
+            last = parse_date(state.get(kind))
+            if last is None:
+                due.add(kind)
+                continue
+            elapsed = (today - last).days
+            if elapsed < self.intervals[kind][tier]:
+                continue
+            if (
+                kind == "stats"
+                and elapsed < self.refresh_days
+                and (pushed is None or pushed < last)
+            ):
+                # nothing was pushed since, the stats are the same
+                continue
+            due.add(kind)
+        for kind in kinds:
+            self.metrics.increment(
+                "CrawlsDue" if kind in due else "CrawlsSkipped", Kind=kind, Tier=tier
+            )
+        return due
+
+    def crawled(self, org, repo, kinds, traffic=None, alerts=None, today=None):
+        """
+        Record that kinds were crawled for the repo today along with the
+        signals the next due() looks at.
+        traffic: the GitHub_v3.get_repo_traffic document, if traffic was crawled
+        alerts: (kind, response) of the GitHub_v4 document, if alerts were
+        """
+        if today is None:
+            today = datetime.date.today()
+        key = self.state_key(org, repo)
+        with self.lock:
+            state = self.store.get(key) or {}
+            for kind in kinds:
+                state[kind] = today.strftime("%Y-%m-%d")
+            if traffic is not None and "views" in traffic:
+                state["traffic_count"] = as_dict(traffic.get("views")).get(
+                    "count", 0
+                ) + as_dict(traffic.get("clones")).get("count", 0)
+            if alerts is not None:
+                kind, response = alerts
+                fingerprint = alerts_fingerprint(response)
+                if kind == "delta":
+                    # only new alerts come back, any at all is a change
+                    changed = fingerprint != alerts_fingerprint({})
+                else:
+                    # the first snapshot has nothing to compare with
+                    changed = state.get("alerts_fingerprint") not in (
+                        None,
+                        fingerprint,
+                    )
+                    state["alerts_fingerprint"] = fingerprint
+                if changed:
+                    state["alerts_changed"] = today.strftime("%Y-%m-%d")
+            self.store.put(key, state)
@@ -0,0 +1,183 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import json
+import re
+import threading
+import time
+
+from urllib.parse import urlparse
+
+# CloudWatch takes at most 100 values per metric in one EMF document
+EMF_MAX_VALUES = 100
+
+
+def endpoint_template(url):
+    """
+    Returns: the path of url with its owner/repo/org segments replaced by
+             placeholders, e.g. /repos/{owner}/{repo}/traffic/views
+    """
+    path = urlparse(url).path
+    path = re.sub(r"^/repos/[^/]+/[^/]+", "/repos/{owner}/{repo}", path)
+    return re.sub(r"^/orgs/[^/]+", "/orgs/{org}", path)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Counters and distributions (latency, bytes, GraphQL cost) keyed by
+        metric name and dimensions such as Api and Endpoint, shared by every
+        client and worker thread. Reported as a table or JSON by the CLI and
+        as CloudWatch Embedded Metric Format in Lambda.
+        """
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.values = {}
+            self.units = {}
+            self.started = time.time()
+
+    def increment(self, name, value=1, **dimensions):
+        key = (name, tuple(sorted(dimensions.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.units[name] = "Count"
+
+    def observe(self, name, value, unit="Milliseconds", **dimensions):
+        key = (name, tuple(sorted(dimensions.items())))
+        with self.lock:
+            self.values.setdefault(key, []).append(value)
+            self.units[name] = unit
+
+    def timer(self, name, **dimensions):
+        """
+        Returns: callable recording the milliseconds since timer() was called
+        """
+        start = time.perf_counter()
+        return lambda: self.observe(
+            name, (time.perf_counter() - start) * 1000, **dimensions
+        )
+
+    def summary(self):
+        """
+        Returns: array of one dict per metric and dimensions, distributions
+                 carry their count, sum, min, p50, p90, p99 and max
+        """
+        with self.lock:
+            counters = dict(self.counters)
+            values = {key: sorted(value) for key, value in self.values.items()}
+            units = dict(self.units)
+        rows = []
+        for (name, dimensions), value in sorted(counters.items()):
+            rows.append(
+                {
+                    "metric": name,
+                    "dimensions": dict(dimensions),
+                    "unit": units[name],
+                    "sum": value,
+                }
+            )
+        for (name, dimensions), value in sorted(values.items()):
+            rows.append(
+                {
+                    "metric": name,
+                    "dimensions": dict(dimensions),
+                    "unit": units[name],
+                    "count": len(value),
+                    "sum": round(sum(value), 3),
+                    "min": round(value[0], 3),
+                    "p50": round(percentile(value, 0.5), 3),
+                    "p90": round(percentile(value, 0.9), 3),
+                    "p99": round(percentile(value, 0.99), 3),
+                    "max": round(value[-1], 3),
+                }
+            )
+        return rows
+
+    def table(self):
+        """
+        Returns: the summary as aligned text lines
+        """
+        lines = []
+        for row in self.summary():
+            dimensions = ",".join(f"{k}={v}" for k, v in row["dimensions"].items())
+            label = f"{row['metric']}{{{dimensions}}}"
+            if "count" in row:
+                lines.append(
+                    f"{label:<72} n={row['count']:<7} p50={row['p50']:<10} "
+                    f"p90={row['p90']:<10} p99={row['p99']:<10} max={row['max']:<10} "
+                    f"sum={row['sum']} {row['unit']}"
+                )
+            else:
+                lines.append(f"{label:<72} {row['sum']}")
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "elapsed": round(time.time() - self.started, 3),
+                    "metrics": self.summary(),
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+    def emf(self, namespace):
+        """
+        One CloudWatch Embedded Metric Format document per set of dimensions,
+        split so no metric carries more than 100 values. Printing them from
+        Lambda is enough for CloudWatch to extract the metrics.
+        Returns: array of json strings
+        """
+        with self.lock:
+            groups = {}
+            for (name, dimensions), value in self.counters.items():
+                groups.setdefault(dimensions, {})[name] = [value]
+            for (name, dimensions), value in self.values.items():
+                groups.setdefault(dimensions, {})[name] = list(value)
+            units = dict(self.units)
+        timestamp = int(time.time() * 1000)
+        documents = []
+        for dimensions, metrics in sorted(groups.items()):
+            longest = max(len(value) for value in metrics.values())
+            for start in range(0, longest, EMF_MAX_VALUES):
+                chunk = {
+                    name: value[start : start + EMF_MAX_VALUES]
+                    for name, value in metrics.items()
+                    if value[start : start + EMF_MAX_VALUES]
+                }
+                document = dict(dimensions)
+                document.update(chunk)
+                document["_aws"] = {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": namespace,
+                            "Dimensions": [[name for name, _ in dimensions]],
+                            "Metrics": [
+                                {"Name": name, "Unit": units[name]} for name in chunk
+                            ],
+                        }
+                    ],
+                }
+                documents.append(json.dumps(document, sort_keys=True))
+        return documents
@@ -0,0 +1,126 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import gzip
+import json
+import os
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed for zstd compression
+    zstandard = None
+
+STYLES = ("pretty", "compact", "ndjson")
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+
+class OutputFormat:
+    def __init__(self, style=None, compression=None):
+        """
+        How documents are serialized before they are stored.
+
+        style: pretty (indented, the default), compact, or ndjson with one
+               record per alert/contributor/traffic datapoint, read from
+               GITHUB_OUTPUT_FORMAT if None
+        compression: none, gzip or zstd (needs the zstandard package), read
+                     from GITHUB_OUTPUT_COMPRESSION if None
+        """
+        if style is None:
+            style = os.getenv("GITHUB_OUTPUT_FORMAT") or "pretty"
+        if compression is None:
+            compression = os.getenv("GITHUB_OUTPUT_COMPRESSION") or "none"
+        if style not in STYLES:
+            raise ValueError(f"Unknown output format {style}, use one of {STYLES}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(
+                f"Unknown compression {compression}, use one of {COMPRESSIONS}"
+            )
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self.style = style
+        self.compression = compression
+
+    @classmethod
+    def from_key(cls, key):
+        """
+        Guess the format a stored document was written in from its extension,
+        pretty and compact JSON can't be told apart
+        Returns: OutputFormat
+        """
+        compression = "none"
+        if key.endswith(".gz"):
+            compression, key = "gzip", key[: -len(".gz")]
+        elif key.endswith(".zst"):
+            compression, key = "zstd", key[: -len(".zst")]
+        style = "ndjson" if key.endswith(".ndjson") else "pretty"
+        return cls(style, compression)
+
+    @property
+    def extension(self):
+        extension = ".ndjson" if self.style == "ndjson" else ".json"
+        if self.compression == "gzip":
+            extension += ".gz"
+        elif self.compression == "zstd":
+            extension += ".zst"
+        return extension
+
+    @property
+    def content_type(self):
+        if self.style == "ndjson":
+            return "application/x-ndjson"
+        return "application/json"
+
+    @property
+    def content_encoding(self):
+        return None if self.compression == "none" else self.compression
+
+    def key(self, key):
+        """
+        Returns: key with its .json extension replaced by this format's
+        """
+        if key.endswith(".json"):
+            key = key[: -len(".json")]
+        return key + self.extension
+
+    def s3_args(self):
+        """
+        Returns: ContentType/ContentEncoding arguments for put_object
+        """
+        args = {"ContentType": self.content_type}
+        if self.content_encoding is not None:
+            args["ContentEncoding"] = self.content_encoding
+        return args
+
+    def encode(self, json_obj, records=None):
+        """
+        Serialize json_obj. For ndjson, records is a callable returning the
+        flattened records of json_obj (see GitHub_Common.Records), without it
+        the whole document is written as a single line.
+        Returns: bytes
+        """
+        if self.style == "pretty":
+            body = json.dumps(json_obj, sort_keys=True, indent=2)
+        elif self.style == "compact":
+            body = json.dumps(json_obj, sort_keys=True, separators=(",", ":"))
+        else:
+            lines = records() if records is not None else [json_obj]
+            body = "".join(
+                json.dumps(line, sort_keys=True, separators=(",", ":")) + "\n"
+                for line in lines
+            )
+        body = body.encode("utf-8")
+        if self.compression == "gzip":
+            body = gzip.compress(body)
+        elif self.compression == "zstd":
+            body = zstandard.ZstdCompressor().compress(body)
+        return body
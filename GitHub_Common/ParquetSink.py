@@ -0,0 +1,327 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import datetime
+import io
+import logging
+import threading
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional, only needed for the Parquet export
+    pyarrow = None
+
+ORG_REPO = [("org", "string", ("org",)), ("repo", "string", ("repo",))]
+COUNT_UNIQUES = [("count", "int64", ("count",)), ("uniques", "int64", ("uniques",))]
+
+# record type (see GitHub_Common.Records) -> (prefix, table, columns)
+# each column is (name, type, path to the value in the record)
+TABLES = {
+    "file": (
+        "traffic",
+        "files",
+        ORG_REPO
+        + [
+            ("name", "string", ("name",)),
+            ("path", "string", ("path",)),
+            ("type", "string", ("type",)),
+            ("size", "int64", ("size",)),
+        ],
+    ),
+    "referrer": (
+        "traffic",
+        "referrers",
+        ORG_REPO + [("referrer", "string", ("referrer",))] + COUNT_UNIQUES,
+    ),
+    "path": (
+        "traffic",
+        "paths",
+        ORG_REPO
+        + [("path", "string", ("path",)), ("title", "string", ("title",))]
+        + COUNT_UNIQUES,
+    ),
+    "view": (
+        "traffic",
+        "views",
+        ORG_REPO + [("timestamp", "timestamp", ("timestamp",))] + COUNT_UNIQUES,
+    ),
+    "clone": (
+        "traffic",
+        "clones",
+        ORG_REPO + [("timestamp", "timestamp", ("timestamp",))] + COUNT_UNIQUES,
+    ),
+    "contributor": (
+        "traffic",
+        "contributors",
+        ORG_REPO + [("login", "string", ("login",)), ("total", "int64", ("total",))],
+    ),
+    "commit_activity": (
+        "traffic",
+        "commit_activity",
+        ORG_REPO
+        + [
+            ("week", "epoch", ("week",)),
+            ("total", "int64", ("total",)),
+            ("days", "list<int64>", ("days",)),
+        ],
+    ),
+    "code_frequency": (
+        "traffic",
+        "code_frequency",
+        ORG_REPO
+        + [
+            ("week", "epoch", ("week",)),
+            ("additions", "int64", ("additions",)),
+            ("deletions", "int64", ("deletions",)),
+        ],
+    ),
+    "participation": (
+        "traffic",
+        "participation",
+        ORG_REPO
+        + [
+            ("week", "int64", ("week",)),
+            ("all", "int64", ("all",)),
+            ("owner", "int64", ("owner",)),
+        ],
+    ),
+    "punch_card": (
+        "traffic",
+        "punch_card",
+        ORG_REPO
+        + [
+            ("day", "int64", ("day",)),
+            ("hour", "int64", ("hour",)),
+            ("commits", "int64", ("commits",)),
+        ],
+    ),
+    "counts": (
+        "cve",
+        "counts",
+        ORG_REPO
+        + [
+            ("forks", "int64", ("forks",)),
+            ("issues", "int64", ("issues",)),
+            ("pull_requests", "int64", ("pullRequests",)),
+            ("stargazers", "int64", ("stargazers",)),
+            ("watchers", "int64", ("watchers",)),
+        ],
+    ),
+    "language": ("cve", "languages", ORG_REPO + [("name", "string", ("name",))]),
+    "vulnerability_alert": (
+        "cve",
+        "vulnerability_alerts",
+        ORG_REPO
+        + [
+            ("id", "string", ("id",)),
+            ("created_at", "timestamp", ("createdAt",)),
+            ("dismissed_at", "timestamp", ("dismissedAt",)),
+            ("dismiss_reason", "string", ("dismissReason",)),
+            ("dismisser", "string", ("dismisser", "login")),
+            ("ghsa_id", "string", ("securityAdvisory", "ghsaId")),
+            ("severity", "string", ("securityVulnerability", "severity")),
+            (
+                "summary",
+                "string",
+                ("securityVulnerability", "advisory", "summary"),
+            ),
+            (
+                "published_at",
+                "timestamp",
+                ("securityVulnerability", "advisory", "publishedAt"),
+            ),
+            (
+                "package_ecosystem",
+                "string",
+                ("securityVulnerability", "package", "ecosystem"),
+            ),
+            (
+                "package_name",
+                "string",
+                ("securityVulnerability", "package", "name"),
+            ),
+            (
+                "vulnerable_version_range",
+                "string",
+                ("securityVulnerability", "vulnerableVersionRange"),
+            ),
+            (
+                "first_patched_version",
+                "string",
+                ("securityVulnerability", "firstPatchedVersion", "identifier"),
+            ),
+            (
+                "updated_at",
+                "timestamp",
+                ("securityVulnerability", "updatedAt"),
+            ),
+            ("manifest_filename", "string", ("vulnerableManifestFilename",)),
+            ("manifest_path", "string", ("vulnerableManifestPath",)),
+            ("vulnerable_requirements", "string", ("vulnerableRequirements",)),
+        ],
+    ),
+}
+
+
+def lookup(record, path):
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def convert(value, column_type):
+    if value is None:
+        return None
+    if column_type == "timestamp":
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+    if column_type == "epoch":
+        return datetime.datetime.utcfromtimestamp(value)
+    return value
+
+
+class Countdown:
+    def __init__(self, count, on_stored):
+        """
+        Calls on_stored once done() has been called for count writes
+        """
+        self.count = count
+        self.on_stored = on_stored
+        self.lock = threading.Lock()
+
+    def done(self, count=1):
+        with self.lock:
+            self.count -= count
+            finished = self.count == 0
+        if finished:
+            self.on_stored()
+
+
+def arrow_type(column_type):
+    if column_type == "string":
+        return pyarrow.string()
+    if column_type == "int64":
+        return pyarrow.int64()
+    if column_type == "list<int64>":
+        return pyarrow.list_(pyarrow.int64())
+    # timestamps are stored as UTC
+    return pyarrow.timestamp("s", tz="UTC")
+
+
+class ParquetSink:
+    def __init__(self, sink, max_rows=100000):
+        """
+        Wraps another sink: documents are passed through to it unchanged and
+        their records (see GitHub_Common.Records) are also collected into
+        typed tables. Each table is written to the wrapped sink as Parquet
+        under {date}/traffic/<table>/ or {date}/cve/<table>/ once it holds
+        max_rows rows and when the sink is closed. {date} is the date of the
+        documents the rows came from, the first part of their key, so each
+        date has its own tables.
+        """
+        if pyarrow is None:
+            raise ValueError("Parquet export needs the pyarrow package")
+        self.sink = sink
+        self.max_rows = max_rows
+        self.rows = {}  # (date, record type) -> (collected at, rows waiting)
+        self.parts = 0
+        self.lock = threading.Lock()
+
+    def write(self, key, json_obj, records=None, on_stored=None):
+        """
+        Write json_obj to the wrapped sink and collect its records.
+        on_stored is called once the document and every Parquet file holding
+        one of its rows were stored by the wrapped sink.
+        Returns: key the wrapped sink wrote to
+        """
+        if records is None or json_obj is None:
+            return self.sink.write(key, json_obj, records, on_stored)
+        rows = [record for record in records() if record["record"] in TABLES]
+        stored = None
+        if on_stored is not None:
+            stored = Countdown(len(rows) + 1, on_stored)
+        key = self.sink.write(
+            key, json_obj, records, stored.done if stored is not None else None
+        )
+        date = key.split("/", 1)[0]
+        for record in rows:
+            self.add(date, record, stored)
+        return key
+
+    def write_bytes(self, key, body, on_stored=None, **s3_args):
+        return self.sink.write_bytes(key, body, on_stored=on_stored, **s3_args)
+
+    def add(self, date, record, stored=None):
+        table = (date, record["record"])
+        with self.lock:
+            if table not in self.rows:
+                self.rows[table] = (datetime.datetime.now(), [])
+            collected, rows = self.rows[table]
+            rows.append((record, stored))
+            if len(rows) < self.max_rows:
+                return
+            del self.rows[table]
+        self.flush(date, record["record"], collected, rows)
+
+    def flush(self, date, record_type, collected, rows):
+        """
+        Write rows of record_type collected on date to the wrapped sink as one
+        Parquet file named after when its first row was collected. rows are
+        (record, Countdown of its document or None) tuples.
+        """
+        prefix, table_name, columns = TABLES[record_type]
+        arrays = []
+        for name, column_type, path in columns:
+            values = [convert(lookup(row, path), column_type) for row, _ in rows]
+            arrays.append(pyarrow.array(values, type=arrow_type(column_type)))
+        table = pyarrow.Table.from_arrays(arrays, names=[c[0] for c in columns])
+        body = io.BytesIO()
+        pyarrow.parquet.write_table(table, body, compression="snappy")
+        with self.lock:
+            self.parts += 1
+            part = self.parts
+        key = (
+            f"{date}/{prefix}/{table_name}/"
+            f"{table_name}-{collected.strftime('%Y-%m-%dT%H-%M-%S')}-{part}.parquet"
+        )
+        counts = {}
+        for _, stored in rows:
+            if stored is not None:
+                counts[stored] = counts.get(stored, 0) + 1
+
+        def on_stored():
+            for stored, count in counts.items():
+                stored.done(count)
+
+        self.sink.write_bytes(
+            key,
+            body.getvalue(),
+            on_stored=on_stored,
+            ContentType="application/vnd.apache.parquet",
+        )
+        logging.info(f"{len(rows)} {table_name} rows written to {key}")
+
+    def close(self):
+        """
+        Write the remaining rows and close the wrapped sink
+        Returns: array of keys the wrapped sink failed to write
+        """
+        with self.lock:
+            pending = list(self.rows.items())
+            self.rows = {}
+        for (date, record_type), (collected, rows) in pending:
+            self.flush(date, record_type, collected, rows)
+        return self.sink.close()
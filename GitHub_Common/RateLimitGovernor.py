@@ -0,0 +1,172 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import calendar
+import datetime
+import logging
+import threading
+import time
+
+
+class RateLimitGovernor:
+    def __init__(self, floor=100, pace_below=1000, sleep_time=16):
+        """
+        Rate limit budget shared by every client and worker thread. Budgets
+        are tracked per bucket (one per API and token, see TokenPool) from
+        the X-RateLimit-* headers and the inline GraphQL rateLimit field.
+
+        Once a bucket drops below pace_below the remaining budget is spread
+        evenly over the time left until reset instead of being spent and then
+        sleeping. Retry-After and secondary rate limits block the bucket for
+        the requested time.
+        """
+        self.floor = floor
+        self.pace_below = pace_below
+        self.sleep_time = sleep_time  # extra seconds to sleep past reset
+        self.secondary_wait = 60  # GitHub asks for at least a minute
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, name):
+        # caller holds the lock
+        if name not in self.buckets:
+            self.buckets[name] = {
+                "remaining": None,
+                "reset": None,
+                "cost": 1,
+                "next_slot": 0,
+                "blocked_until": 0,
+            }
+        return self.buckets[name]
+
+    def update(self, name, remaining, reset, cost=None):
+        """
+        Record the remaining budget and reset time (epoch seconds) reported
+        by the API for bucket name, plus the cost of the last query if known
+        """
+        with self.lock:
+            bucket = self.bucket(name)
+            bucket["remaining"] = int(remaining)
+            bucket["reset"] = float(reset)
+            if cost is not None:
+                bucket["cost"] = max(1, int(cost))
+
+    def update_from_headers(self, name, headers):
+        """
+        Record the X-RateLimit-* headers of a response
+        """
+        if "X-RateLimit-Remaining" in headers:
+            self.update(
+                name, headers["X-RateLimit-Remaining"], headers["X-RateLimit-Reset"]
+            )
+
+    def update_from_graphql(self, name, rate_limit):
+        """
+        Record the rateLimit { cost remaining resetAt } object of a response
+        """
+        reset = datetime.datetime.strptime(rate_limit["resetAt"], "%Y-%m-%dT%H:%M:%SZ")
+        self.update(
+            name,
+            rate_limit["remaining"],
+            calendar.timegm(reset.timetuple()),
+            rate_limit.get("cost"),
+        )
+
+    def throttled(self, name, response):
+        """
+        Check a response for primary/secondary rate limiting and block the
+        bucket until it may be retried
+        Returns: True if the request should be retried
+        """
+        if response.status_code not in (403, 429):
+            return False
+        headers = response.headers
+        if "Retry-After" in headers:
+            wait = float(headers["Retry-After"])
+        elif headers.get("X-RateLimit-Remaining") == "0":
+            wait = float(headers["X-RateLimit-Reset"]) - time.time() + self.sleep_time
+        elif "rate limit" in response.text.lower():
+            wait = self.secondary_wait
+        else:
+            return False
+        self.block(name, wait)
+        return True
+
+    def block(self, name, wait):
+        """
+        Hold every request to bucket name for wait seconds
+        """
+        logging.warn(f"Rate limited by GitHub, pausing {name} requests for {wait}s")
+        with self.lock:
+            bucket = self.bucket(name)
+            bucket["blocked_until"] = max(bucket["blocked_until"], time.time() + wait)
+
+    def choose(self, names):
+        """
+        Pick the bucket with the most remaining budget, skipping buckets that
+        are blocked or exhausted. Buckets that haven't reported a budget yet
+        count as full. If every bucket is benched the one freed first wins.
+        Returns: the chosen bucket name
+        """
+        with self.lock:
+            now = time.time()
+            best, best_score = None, None
+            soonest, soonest_free = None, None
+            for name in names:
+                bucket = self.bucket(name)
+                free_at = bucket["blocked_until"]
+                known = bucket["remaining"] is not None and bucket["reset"] > now
+                if known and bucket["remaining"] - self.floor < bucket["cost"]:
+                    free_at = max(free_at, bucket["reset"] + self.sleep_time)
+                if free_at > now:
+                    # benched while exhausted or rate limited
+                    if soonest is None or free_at < soonest_free:
+                        soonest, soonest_free = name, free_at
+                    continue
+                score = bucket["remaining"] if known else float("inf")
+                if best is None or score > best_score:
+                    best, best_score = name, score
+            return best if best is not None else soonest
+
+    def acquire(self, name, cost=None):
+        """
+        Reserve cost (default: the last observed query cost) from bucket name,
+        sleeping first if the bucket is blocked, exhausted or being paced
+        """
+        with self.lock:
+            bucket = self.bucket(name)
+            if cost is None:
+                cost = bucket["cost"]
+            now = time.time()
+            wait = bucket["blocked_until"] - now
+            if bucket["remaining"] is not None and bucket["reset"] > now:
+                available = bucket["remaining"] - self.floor
+                if available < cost:
+                    logging.warn(
+                        "Not enough tokens to complete request. Waiting until token refresh to proceed."
+                    )
+                    # hold every other caller until the reset too
+                    bucket["blocked_until"] = bucket["reset"] + self.sleep_time
+                    wait = bucket["blocked_until"] - now
+                    # budget is unknown again until the next response reports it
+                    bucket["remaining"] = None
+                else:
+                    if bucket["remaining"] < self.pace_below:
+                        # spread what is left evenly until the reset
+                        interval = (bucket["reset"] - now) * cost / available
+                        slot = max(bucket["next_slot"], now)
+                        bucket["next_slot"] = slot + interval
+                        wait = max(wait, slot - now)
+                    bucket["remaining"] -= cost
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,106 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Flattens the per-repo documents into one record per datapoint. Every record
+carries its org, repo and a "record" field naming what it is.
+"""
+
+
+def as_list(value):
+    # endpoints that answered 202/204 are stored as []
+    return value if isinstance(value, list) else []
+
+
+def as_dict(value):
+    return value if isinstance(value, dict) else {}
+
+
+def traffic_records(org, repo, doc):
+    """
+    Flatten a GitHub_v3.get_repo_traffic document
+    Returns: iterator of records, none for a repo that failed (None)
+    """
+    if doc is None:
+        return
+    base = {"org": org, "repo": repo}
+    for content in as_list(doc.get("repo_file_names")):
+        yield dict(
+            base,
+            record="file",
+            name=content.get("name"),
+            path=content.get("path"),
+            type=content.get("type"),
+            size=content.get("size"),
+        )
+    for referrer in as_list(doc.get("referrers")):
+        yield dict(base, record="referrer", **referrer)
+    for path in as_list(doc.get("paths")):
+        yield dict(base, record="path", **path)
+    for name in ("views", "clones"):
+        for point in as_list(as_dict(doc.get(name)).get(name)):
+            yield dict(base, record=name[:-1], **point)
+    stats = as_dict(doc.get("stats"))
+    for contributor in as_list(stats.get("contributors")):
+        yield dict(
+            base,
+            record="contributor",
+            login=as_dict(contributor.get("author")).get("login"),
+            total=contributor.get("total"),
+            weeks=contributor.get("weeks"),
+        )
+    for week in as_list(stats.get("commit_activity")):
+        yield dict(base, record="commit_activity", **week)
+    for week in as_list(stats.get("code_frequency")):
+        yield dict(
+            base,
+            record="code_frequency",
+            week=week[0],
+            additions=week[1],
+            deletions=week[2],
+        )
+    participation = as_dict(stats.get("participation"))
+    for index, total in enumerate(participation.get("all", [])):
+        owner = participation.get("owner", [])
+        yield dict(
+            base,
+            record="participation",
+            week=index,
+            all=total,
+            owner=owner[index] if index < len(owner) else None,
+        )
+    for cell in as_list(stats.get("punch_card")):
+        yield dict(
+            base, record="punch_card", day=cell[0], hour=cell[1], commits=cell[2]
+        )
+
+
+def repo_records(org, repo, doc):
+    """
+    Flatten a GitHub_v4.get_data_for_repo document
+    Returns: iterator of records
+    """
+    base = {"org": org, "repo": repo}
+    repository = doc["data"]["organization"]["repository"]
+    counts = {}
+    for name in ("forks", "issues", "pullRequests", "stargazers", "watchers"):
+        if name in repository:
+            counts[name] = repository[name]["totalCount"]
+    if counts:
+        yield dict(base, record="counts", **counts)
+    for edge in repository.get("languages", {}).get("edges", []):
+        yield dict(base, record="language", name=edge["node"]["name"])
+    for edge in repository["vulnerabilityAlerts"]["edges"]:
+        yield dict(
+            base, record="vulnerability_alert", cursor=edge["cursor"], **edge["node"]
+        )
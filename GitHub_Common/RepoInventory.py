@@ -0,0 +1,71 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import threading
+import time
+
+
+class RepoInventory:
+    def __init__(self, lister, ttl=None):
+        """
+        The repos of each org, listed once and shared by every client and
+        worker. Repos are dicts with name, nameWithOwner, isArchived, isFork,
+        pushedAt and visibility (PUBLIC, PRIVATE or INTERNAL).
+
+        lister: callable taking an org and returning its repos, such as
+                GitHub_v4.get_org_repo_list
+        ttl: seconds a listing is reused, read from GITHUB_INVENTORY_TTL
+             (default 3600) if None
+        """
+        if ttl is None:
+            ttl = int(os.getenv("GITHUB_INVENTORY_TTL") or "3600")
+        self.lister = lister
+        self.ttl = ttl
+        self.orgs = {}  # org -> (repos, listed at)
+        self.org_locks = {}
+        self.lock = threading.Lock()
+
+    def repos(self, org, archived=None, fork=None, visibility=None):
+        """
+        Repos of org, listed again once the cached listing is older than ttl.
+        Concurrent callers wait for a single listing.
+        archived/fork: only repos that are (True) or are not (False) archived
+                       or forks, either if None
+        visibility: only repos with one of these visibilities, any if None
+        Returns: array of repo dicts
+        """
+        with self.lock:
+            org_lock = self.org_locks.setdefault(org, threading.Lock())
+        with org_lock:
+            entry = self.orgs.get(org)
+            if entry is None or time.time() - entry[1] >= self.ttl:
+                entry = (list(self.lister(org)), time.time())
+                self.orgs[org] = entry
+        return [
+            repo
+            for repo in entry[0]
+            if (archived is None or repo.get("isArchived", False) == archived)
+            and (fork is None or repo.get("isFork", False) == fork)
+            and (visibility is None or repo.get("visibility") in visibility)
+        ]
+
+    def invalidate(self, org=None):
+        """
+        Forget the listing of org, or of every org if None
+        """
+        with self.lock:
+            if org is None:
+                self.orgs = {}
+            else:
+                self.orgs.pop(org, None)
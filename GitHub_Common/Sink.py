@@ -0,0 +1,177 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import boto3
+import logging
+import os
+import threading
+import time
+
+from .Metrics import Metrics
+from .OutputFormat import OutputFormat
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DiskSink:
+    def __init__(self, root="output", output_format=None, metrics=None):
+        """
+        Writes documents under root, keyed the same way as the S3 bucket so
+        upload_files_to_s3 can copy the tree as is. Used for offline runs.
+        output_format: GitHub_Common.OutputFormat, read from the environment
+                       if None
+        metrics: shared GitHub_Common.Metrics recording bytes written
+        """
+        self.root = root
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.output_format = (
+            output_format if output_format is not None else OutputFormat()
+        )
+
+    def write(self, key, json_obj, records=None, on_stored=None):
+        """
+        Write json blob (json_obj) to root/key, records flattens it for ndjson.
+        on_stored is called once the file is written.
+        Returns: key with the output format's extension
+        """
+        key = self.output_format.key(key)
+        return self.write_bytes(
+            key, self.output_format.encode(json_obj, records), on_stored=on_stored
+        )
+
+    def write_bytes(self, key, body, on_stored=None, **s3_args):
+        """
+        Write already serialized body to root/key, s3_args are ignored.
+        on_stored is called once the file is written.
+        Returns: key
+        """
+        file_path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(body)
+        self.metrics.observe("BytesWritten", len(body), unit="Bytes", Sink="disk")
+        if on_stored is not None:
+            on_stored()
+        return key
+
+    def close(self):
+        """
+        Nothing is buffered
+        Returns: empty array of failed keys
+        """
+        return []
+
+
+class S3Sink:
+    def __init__(
+        self,
+        bucket_name,
+        workers=8,
+        max_in_flight=None,
+        s3_client=None,
+        output_format=None,
+        metrics=None,
+    ):
+        """
+        Streams documents straight to S3 as they are produced. Uploads run on
+        a pool of workers and write() blocks once max_in_flight documents
+        (default: 4 per worker) are waiting, so memory stays bounded no matter
+        how large the crawl is. Call close() to wait for the last uploads.
+        output_format: GitHub_Common.OutputFormat, read from the environment
+                       if None
+        metrics: shared GitHub_Common.Metrics recording upload latency and
+                 bytes written
+        """
+        self.bucket_name = bucket_name
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.output_format = (
+            output_format if output_format is not None else OutputFormat()
+        )
+        self.s3_client = s3_client if s3_client is not None else boto3.client("s3")
+        if max_in_flight is None:
+            max_in_flight = 4 * workers
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.failed = []
+        self.uploaded = 0
+        self.uploaded_bytes = 0
+        self.started = time.time()
+
+    def write(self, key, json_obj, records=None, on_stored=None):
+        """
+        Queue json blob (json_obj) for upload to key, blocking while the
+        in-flight queue is full. records flattens it for ndjson. on_stored
+        is called from an upload worker once the upload succeeded, never if
+        it failed.
+        Returns: key with the output format's extension
+        """
+        key = self.output_format.key(key)
+        # serialize now so the caller is free to reuse json_obj
+        body = self.output_format.encode(json_obj, records)
+        return self.write_bytes(
+            key, body, on_stored=on_stored, **self.output_format.s3_args()
+        )
+
+    def write_bytes(self, key, body, on_stored=None, **s3_args):
+        """
+        Queue already serialized body for upload to key, s3_args (ContentType,
+        ContentEncoding) are passed on to put_object. on_stored is called
+        once the upload succeeded.
+        Returns: key
+        """
+        self.slots.acquire()
+        try:
+            self.pool.submit(self.upload, key, body, s3_args, on_stored)
+        except RuntimeError:
+            self.slots.release()
+            raise
+        return key
+
+    def upload(self, key, body, s3_args, on_stored=None):
+        upload_time = self.metrics.timer("Latency", Api="s3", Endpoint="put_object")
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name, Key=key, Body=body, **s3_args
+            )
+            upload_time()
+            self.metrics.observe("BytesWritten", len(body), unit="Bytes", Sink="s3")
+        except Exception as e:
+            # keep going, the failed keys are reported by close()
+            logging.critical(f"Failed to upload {key}: {e}")
+            with self.lock:
+                self.failed.append(key)
+        else:
+            with self.lock:
+                self.uploaded += 1
+                self.uploaded_bytes += len(body)
+            if on_stored is not None:
+                try:
+                    on_stored()
+                except Exception as e:
+                    # nobody waits on the upload futures, log it here
+                    logging.critical(f"Failed to record {key} as stored: {e}")
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """
+        Wait for every queued upload to finish
+        Returns: array of keys that failed to upload
+        """
+        self.pool.shutdown(wait=True)
+        elapsed = max(time.time() - self.started, 1e-6)
+        logging.info(
+            f"Uploaded {self.uploaded} documents ({self.uploaded_bytes / 1024 / 1024:.1f}MB) "
+            f"to {self.bucket_name} in {elapsed:.1f}s"
+        )
+        return self.failed
@@ -0,0 +1,147 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import boto3
+import json
+import os
+import sqlite3
+import threading
+
+from botocore.exceptions import ClientError
+
+
+class FileStateStore:
+    def __init__(self, path):
+        """
+        Key/value store for crawl state kept in a local JSON file. The whole
+        file is rewritten on every put so it is always consistent on disk.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = {}
+        if os.path.exists(path):
+            with open(path, "rt") as f:
+                self.state = json.load(f)
+
+    def get(self, key):
+        """
+        Returns: value stored under key or None
+        """
+        with self.lock:
+            return self.state.get(key)
+
+    def put(self, key, value):
+        """
+        Store value (anything json serializable) under key
+        """
+        with self.lock:
+            self.state[key] = value
+            self.save()
+
+    def delete(self, key):
+        with self.lock:
+            if self.state.pop(key, None) is not None:
+                self.save()
+
+    def save(self):
+        # caller holds the lock
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # write then rename so a crash never leaves half a file behind
+        with open(f"{self.path}.tmp", "wt") as f:
+            json.dump(self.state, f, sort_keys=True)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+class SQLiteStateStore:
+    def __init__(self, path):
+        """
+        Key/value store for crawl state kept in a local SQLite file. Unlike
+        FileStateStore each put only writes its own row, so it suits state
+        that changes on every page such as checkpoints.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.db.commit()
+
+    def get(self, key):
+        """
+        Returns: value stored under key or None
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT value FROM state WHERE key = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key, value):
+        """
+        Store value (anything json serializable) under key
+        """
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO state VALUES (?, ?)", (key, json.dumps(value))
+            )
+            self.db.commit()
+
+    def delete(self, key):
+        with self.lock:
+            self.db.execute("DELETE FROM state WHERE key = ?", (key,))
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class S3StateStore:
+    def __init__(self, bucket_name, prefix="state/", s3_client=None):
+        """
+        Key/value store for crawl state with one S3 object per key so
+        concurrent Lambda invocations never overwrite each other's state.
+        """
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.s3_client = s3_client if s3_client is not None else boto3.client("s3")
+
+    def get(self, key):
+        """
+        Returns: value stored under key or None
+        """
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=self.prefix + key
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def put(self, key, value):
+        """
+        Store value (anything json serializable) under key
+        """
+        self.s3_client.put_object(
+            Bucket=self.bucket_name, Key=self.prefix + key, Body=json.dumps(value)
+        )
+
+    def delete(self, key):
+        self.s3_client.delete_object(Bucket=self.bucket_name, Key=self.prefix + key)
@@ -0,0 +1,66 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+from .RateLimitGovernor import RateLimitGovernor
+
+
+class TokenPool:
+    def __init__(self, tokens, governor=None):
+        """
+        Pool of GitHub tokens sharing one rate limit governor. Every token has
+        its own bucket per API so each request goes to the token with the
+        most budget left, and exhausted tokens sit out until their reset.
+
+        tokens: a token, a comma separated string of tokens or a list of them
+        """
+        if isinstance(tokens, str):
+            tokens = tokens.split(",")
+        self.tokens = [token.strip() for token in tokens if token and token.strip()]
+        if not self.tokens:
+            raise ValueError("At least one GitHub token is required")
+        self.governor = governor if governor is not None else RateLimitGovernor()
+
+    def bucket_name(self, resource, token):
+        # use the token's position so tokens never end up in logs
+        return f"{resource}:{self.tokens.index(token)}"
+
+    def acquire(self, resource):
+        """
+        Pick the token with the most remaining budget for resource and reserve
+        a request from it, waiting if every token is benched
+        Returns: the token to use
+        """
+        names = [self.bucket_name(resource, token) for token in self.tokens]
+        name = self.governor.choose(names)
+        self.governor.acquire(name)
+        return self.tokens[names.index(name)]
+
+    def headers(self, token, headers=None):
+        """
+        Returns: copy of headers with the Authorization header for token
+        """
+        request_headers = dict(headers or {})
+        request_headers["Authorization"] = f"token {token}"
+        return request_headers
+
+    def update_from_headers(self, resource, token, headers):
+        self.governor.update_from_headers(self.bucket_name(resource, token), headers)
+
+    def update_from_graphql(self, resource, token, rate_limit):
+        self.governor.update_from_graphql(self.bucket_name(resource, token), rate_limit)
+
+    def throttled(self, resource, token, response):
+        return self.governor.throttled(self.bucket_name(resource, token), response)
+
+    def block(self, resource, token, wait):
+        self.governor.block(self.bucket_name(resource, token), wait)
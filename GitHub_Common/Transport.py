@@ -0,0 +1,68 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+class Transport:
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        """
+        Pooled keep-alive HTTP session shared by the v3 and v4 clients so
+        repeated calls to api.github.com reuse open TLS connections.
+
+        Values not passed in are read from the environment
+        (GITHUB_POOL_SIZE, GITHUB_CONNECT_TIMEOUT, GITHUB_READ_TIMEOUT).
+        """
+        if pool_size is None:
+            pool_size = int(os.getenv("GITHUB_POOL_SIZE") or "10")
+        if connect_timeout is None:
+            connect_timeout = float(os.getenv("GITHUB_CONNECT_TIMEOUT") or "5")
+        if read_timeout is None:
+            read_timeout = float(os.getenv("GITHUB_READ_TIMEOUT") or "60")
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        # retries are handled by the API classes so keep the adapter at 0
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+        )
+
+    def get(self, url, headers=None, **kwargs):
+        """
+        GET url over the pooled session
+        Returns: requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.get(url, headers=headers, **kwargs)
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        """
+        POST json to url over the pooled session
+        Returns: requests.Response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.post(url, json=json, headers=headers, **kwargs)
+
+    def close(self):
+        """
+        Close all pooled connections
+        """
+        self.session.close()
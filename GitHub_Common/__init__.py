@@ -0,0 +1,26 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+from .Checkpoint import Checkpoint
+from .Collector import Collector
+from .CrawlScheduler import CrawlScheduler
+from .ConditionalCache import S3ConditionalCache, SQLiteConditionalCache
+from .Metrics import Metrics
+from .OutputFormat import OutputFormat
+from .ParquetSink import ParquetSink
+from .RateLimitGovernor import RateLimitGovernor
+from .RepoInventory import RepoInventory
+from .Sink import DiskSink, S3Sink
+from .StateStore import FileStateStore, S3StateStore, SQLiteStateStore
+from .TokenPool import TokenPool
+from .Transport import Transport
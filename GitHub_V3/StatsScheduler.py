@@ -0,0 +1,174 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import logging
+import threading
+import time
+
+
+class StatsScheduler:
+    def __init__(self, run_query, max_attempts=5, base_delay=3):
+        """
+        Tracks /stats/* endpoints that answered 202 (GitHub is still computing
+        them) and re-polls them later with exponential backoff. A repo's
+        traffic document is held back until all of its stats are filled in or
+        the retries run out, then handed to its writer.
+
+        run_query: callable(query, accepted=callable) used to re-poll an endpoint
+        """
+        self.run_query = run_query
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.pending = []  # [{key, doc, query, attempts, due}]
+        self.held = {}  # key -> write callable waiting on pending stats
+        self.failed = set()  # keys whose write callable raised
+        self.lock = threading.Lock()
+
+    def defer(self, key, doc, query):
+        """
+        Record that query returned 202 for the repo identified by key, the
+        result will be merged into doc["stats"] once GitHub has it ready
+        """
+        with self.lock:
+            self.pending.append(
+                {
+                    "key": key,
+                    "doc": doc,
+                    "query": query,
+                    "attempts": 0,
+                    "due": time.time() + self.base_delay,
+                }
+            )
+
+    def submit(self, key, write):
+        """
+        Call write() now if the repo has no pending stats, otherwise hold it
+        until they are resolved. Also re-polls the repo's own entries that
+        are due, other repos are left to their own submit() or drain() so
+        their writers run on the thread handling them.
+        Returns: array of write() results, empty or just this repo's
+        """
+        with self.lock:
+            self.held[key] = write
+        return self.poll(key)
+
+    def poll(self, key=None):
+        """
+        Re-poll every pending endpoint whose backoff has expired
+        Returns: array of write() results for repos that are now complete
+        """
+        now = time.time()
+        with self.lock:
+            due = [
+                entry
+                for entry in self.pending
+                if entry["due"] <= now and (key is None or entry["key"] == key)
+            ]
+        for entry in due:
+            self.repoll(entry)
+        return self.release(key)
+
+    def repoll(self, entry):
+        accepted = []
+        try:
+            body = self.run_query(entry["query"], accepted=accepted.append)
+        except RuntimeError as e:
+            # GitHubV3Error is a RuntimeError, keep the empty placeholder
+            # rather than losing the whole repo
+            logging.critical(e.args)
+            accepted = []
+            body = []
+        name = entry["query"].rsplit("/", 1)[-1]
+        with self.lock:
+            entry["attempts"] += 1
+            if accepted and entry["attempts"] < self.max_attempts:
+                entry["due"] = time.time() + self.base_delay * 2 ** entry["attempts"]
+                return
+            if accepted:
+                logging.warn(
+                    f"Stats for {entry['query']} still not ready after {entry['attempts']} retries, storing empty result"
+                )
+            entry["doc"]["stats"][name] = body
+            self.pending.remove(entry)
+
+    def release(self, key=None):
+        """
+        Write every held repo (or just key) that has no pending stats left.
+        A write() that raises is logged and its key added to failed, the
+        other repos are still written.
+        """
+        with self.lock:
+            pending_keys = {entry["key"] for entry in self.pending}
+            ready = [
+                held_key
+                for held_key in self.held
+                if held_key not in pending_keys and (key is None or held_key == key)
+            ]
+            writers = [(held_key, self.held.pop(held_key)) for held_key in ready]
+        written = []
+        for held_key, write in writers:
+            try:
+                written.append(write())
+            except Exception as e:
+                logging.critical(f"Failed to write {held_key}: {e}")
+                with self.lock:
+                    self.failed.add(held_key)
+        return written
+
+    def holds(self, key):
+        """
+        Returns: True while key has pending stats or a writer waiting on them
+        """
+        with self.lock:
+            return key in self.held or any(
+                entry["key"] == key for entry in self.pending
+            )
+
+    def discard(self, key=None):
+        """
+        Forget the pending endpoints and held writer of key, or of every repo
+        if None, without writing anything
+        """
+        with self.lock:
+            self.pending = [
+                entry
+                for entry in self.pending
+                if key is not None and entry["key"] != key
+            ]
+            if key is None:
+                self.held = {}
+                self.failed = set()
+            else:
+                self.held.pop(key, None)
+                self.failed.discard(key)
+
+    def drain(self, key=None, expired=None):
+        """
+        Block until every pending endpoint (or just those for key) is resolved,
+        or until expired() returns True
+        Returns: array of write() results for the repos written
+        """
+        written = []
+        while True:
+            written += self.poll(key)
+            with self.lock:
+                dues = [
+                    entry["due"]
+                    for entry in self.pending
+                    if key is None or entry["key"] == key
+                ]
+            if not dues:
+                return written + self.release(key)
+            if expired is not None and expired():
+                return written
+            time.sleep(max(0, min(dues) - time.time()))
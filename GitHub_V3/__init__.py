@@ -13,12 +13,30 @@
 
 import boto3
 import datetime
-import json
 import logging
 import os
-import requests
 import time
 
+from .StatsScheduler import StatsScheduler
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from GitHub_Common import (
+    Collector,
+    DiskSink,
+    Metrics,
+    OutputFormat,
+    RepoInventory,
+    TokenPool,
+    Transport,
+)
+from GitHub_Common.ConditionalCache import (
+    cache_key,
+    conditional_headers,
+    entry_from_response,
+    response_from_entry,
+)
+from GitHub_Common.Metrics import endpoint_template
+from GitHub_Common.Records import traffic_records
 from urllib.parse import parse_qs
 
 
@@ -29,57 +47,170 @@ class GitHubV3Error(RuntimeError):
 
 class GitHub_v3:
     # functions
-    def __init__(self, token):
+    def __init__(
+        self,
+        token,
+        transport=None,
+        endpoint_workers=None,
+        stats_retries=None,
+        governor=None,
+        cache=None,
+        sink=None,
+        output_format=None,
+        s3_client=None,
+        checkpoint=None,
+        metrics=None,
+        inventory=None,
+        scheduler=None,
+    ):
         """
         Uses the v3 GitHub API to get traffic and repo files.
+
+        token: a token, comma separated tokens, a list of them or a
+               GitHub_Common.TokenPool
+        transport: shared GitHub_Common.Transport, a new one is created if None
+        governor: shared GitHub_Common.RateLimitGovernor used when token isn't
+                  already a TokenPool, a new one is created if None
+        endpoint_workers: number of a repo's traffic/stats endpoints to request
+                          at once, read from GITHUB_ENDPOINT_WORKERS if None
+        stats_retries: times to re-poll a /stats/* endpoint that answered 202,
+                       read from GITHUB_STATS_RETRIES if None, 0 stores []
+        cache: optional conditional request cache (see
+               GitHub_Common.ConditionalCache), 304s are served from it
+        sink: where traffic documents are written, a GitHub_Common.DiskSink
+              under output/ if None
+        output_format: GitHub_Common.OutputFormat for the Lambda S3 writer,
+                       compact JSON unless GITHUB_OUTPUT_FORMAT is set
+        s3_client: boto3 S3 client reused by the Lambda S3 writer, a new one
+                   is created per repo if None
+        checkpoint: optional GitHub_Common.Checkpoint, repos already written
+                    are skipped and paginated queries resume where they left off
+        metrics: shared GitHub_Common.Metrics recording requests, latency,
+                 retries, bytes written and per-repo time
+        inventory: GitHub_Common.RepoInventory the org repo lists are read
+                   from, shared with GitHub_v4 to list each org once. Repos
+                   are listed over REST with list_org_repos if None.
+        scheduler: optional GitHub_Common.CrawlScheduler, only the traffic
+                   and stats due for a repo are requested
         """
+        self.transport = transport if transport is not None else Transport()
+        if endpoint_workers is None:
+            endpoint_workers = int(os.getenv("GITHUB_ENDPOINT_WORKERS") or "1")
+        self.endpoint_workers = max(1, endpoint_workers)
         self.github_v3_url = "https://api.github.com"
-        self.github_v3_normal_headers = {"Authorization": None}
-        self.github_v3_normal_headers["Authorization"] = f"token {token}"
+        # Authorization is added per request from the token pool
+        self.github_v3_normal_headers = {}
         self.sleep_time = 16  # number of seconds to sleep
         self.max_retry_count = 5
+        # shared by every worker and client using the same tokens
+        if not isinstance(token, TokenPool):
+            token = TokenPool(token, governor)
+        self.token_pool = token
+        self.cache = cache
+        self.sink = sink if sink is not None else DiskSink()
+        if output_format is None:
+            output_format = OutputFormat(os.getenv("GITHUB_OUTPUT_FORMAT") or "compact")
+        self.output_format = output_format
+        self.s3_client = s3_client
+        self.checkpoint = checkpoint
+        self.metrics = metrics if metrics is not None else Metrics()
+        if inventory is None:
+            inventory = RepoInventory(self.list_org_repos)
+        self.inventory = inventory
+        self.scheduler = scheduler
+        if stats_retries is None:
+            stats_retries = int(os.getenv("GITHUB_STATS_RETRIES") or "5")
+        self.stats_scheduler = StatsScheduler(
+            self.github_v3_run_query, max_attempts=stats_retries
+        )
+        # org/repo names write_org_traffic couldn't collect
+        self.failed = []
 
-    def write_structured_json(self, file_name, json_obj):
+    def write_structured_json(self, file_name, json_obj, records=None, on_stored=None):
         """
-        Writes json blob (json_obj) to a file at file_name
+        Writes json blob (json_obj) to file_name in the sink, on_stored is
+        called once the sink has stored it
+        Returns: file name with the sink's output format extension
         """
         curr_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        os.makedirs(f"output/{curr_date}/traffic", exist_ok=True)
-        with open(f"output/{curr_date}/traffic/{file_name}", "wt") as f:
-            json.dump(json_obj, f, sort_keys=True, indent=2)
+        key = self.sink.write(
+            f"{curr_date}/traffic/{file_name}", json_obj, records, on_stored
+        )
+        return key.rsplit("/", 1)[-1]
 
-    def github_v3_run_query(self, query, headers=None):
+    def github_v3_run_query(self, query, headers=None, accepted=None):
         """
         Make a query to the v3 GitHub API.
+        accepted: optional callable given the query when GitHub answers 202
         Returns: Paginated responses or an empty array.
         """
+        body = None
+        for page in self.github_v3_query_pages(query, headers, accepted):
+            if body is None:
+                body = page
+            else:
+                # grow the first page in place rather than copying every page
+                body.extend(page)
+        return body
+
+    def github_v3_query_pages(self, query, headers=None, accepted=None):
+        """
+        Generator over the pages of a v3 query, fetching the next page only
+        once the caller asks for it.
+        accepted: optional callable given the query when GitHub answers 202
+        Returns: iterator of each page's json body
+        """
         for count in range(1, self.max_retry_count + 1):
             if headers is None:
                 headers = self.github_v3_normal_headers
-            response = requests.get(self.github_v3_url + query, headers=headers)
+            response = self.governed_get(self.github_v3_url + query, headers)
 
             if "link" in response.headers:
                 # handle pagination
                 page_count, clean_link = self.github_pagination_setup(
                     response.headers["link"]
                 )
-                new_body = response.json()
-                for step in range(2, page_count + 1):
-                    response = requests.get(clean_link + str(step), headers=headers)
+                scope = f"v3{query}"
+                pages = []
+                if self.checkpoint is not None:
+                    # pages fetched before an interrupted run are replayed
+                    pages, _ = self.checkpoint.load_pages(scope)
+                if pages:
+                    yield from pages
+                else:
+                    pages = [response.json()]
+                    self.save_query_page(scope, 1, pages[0], page_count)
+                    yield pages[0]
+                for step in range(len(pages) + 1, page_count + 1):
+                    response = self.governed_get(clean_link + str(step), headers)
                     if 200 <= response.status_code < 300:
-                        new_body = new_body + response.json()
+                        page = response.json()
+                        self.save_query_page(scope, step, page, page_count)
+                        yield page
                     else:
                         logging.warn(
                             f"Request failed, retrying in {self.sleep_time} seconds. Number of recounts left: {self.max_retry_count - count}"
                         )
                         time.sleep(self.sleep_time)
-                return new_body
+                if self.checkpoint is not None:
+                    self.checkpoint.clear_pages(scope)
+                return
             elif response.status_code == 202 or response.status_code == 204:
                 # these status codes return no content so return empty array
-                return []
+                self.metrics.increment(
+                    "NoContent",
+                    Endpoint=endpoint_template(query),
+                    Status=str(response.status_code),
+                )
+                if response.status_code == 202 and accepted is not None:
+                    # stats are still being computed, let the caller retry later
+                    accepted(query)
+                yield []
+                return
             elif "link" not in response.headers:
                 # nothing to paginate and not empty body, return body json data
-                return response.json()
+                yield response.json()
+                return
             elif 400 <= response.status_code < 500:
                 # client error
                 # raise exception
@@ -93,11 +224,67 @@ class GitHub_v3:
                     raise GitHubV3Error(msg)
                 else:
                     # sleep and retry again as it might just be a transient issue
+                    self.metrics.increment(
+                        "Retries",
+                        Api="rest",
+                        Endpoint=endpoint_template(query),
+                        Reason="server_error",
+                    )
                     logging.warn(
                         f"Request failed due to API issues, retrying in {self.sleep_time} seconds. Number of recounts left: {self.max_retry_count - count}"
                     )
                     time.sleep(self.sleep_time)
 
+    def save_query_page(self, scope, step, page, page_count):
+        # the last page is never saved, the query is complete once it's fetched
+        if self.checkpoint is not None and step < page_count:
+            self.checkpoint.save_page(scope, step - 1, page, page_count)
+
+    def governed_get(self, url, headers):
+        """
+        GET url with the token that has the most budget left, waiting out and
+        retrying primary/secondary rate limit responses. With a cache the
+        request is conditional and a 304 is answered from the cached body.
+        Returns: requests.Response
+        """
+        endpoint = endpoint_template(url)
+        for count in range(1, self.max_retry_count + 1):
+            token = self.token_pool.acquire("core")
+            key = cache_key(url, token)
+            cached = self.cache.get(key) if self.cache is not None else None
+            request_headers = headers
+            if cached is not None:
+                request_headers = conditional_headers(cached, headers)
+            request_time = self.metrics.timer("Latency", Api="rest", Endpoint=endpoint)
+            response = self.transport.get(
+                url, headers=self.token_pool.headers(token, request_headers)
+            )
+            request_time()
+            self.metrics.increment(
+                "Requests",
+                Api="rest",
+                Endpoint=endpoint,
+                Status=str(response.status_code),
+            )
+            self.token_pool.update_from_headers("core", token, response.headers)
+            if not self.token_pool.throttled("core", token, response):
+                break
+            self.metrics.increment(
+                "Retries", Api="rest", Endpoint=endpoint, Reason="throttled"
+            )
+        else:
+            msg = f"Rate limited on every retry when requesting: {url}"
+            raise GitHubV3Error(msg)
+        if self.cache is None:
+            return response
+        if response.status_code == 304 and cached is not None:
+            # not modified, and GitHub doesn't count it against the rate limit
+            return response_from_entry(cached, url)
+        entry = entry_from_response(response)
+        if entry is not None:
+            self.cache.put(key, entry)
+        return response
+
     def github_pagination_setup(self, link_header):
         """
         Gathers pagination information
@@ -132,29 +319,74 @@ class GitHub_v3:
         """
         return self.github_v3_run_query("/rate_limit")
 
-    def write_org_traffic(self, org, run_lambda=False):
+    def write_org_traffic(self, org, run_lambda=False, collector=None):
         """
         Get the orgs repo traffic and write them to their respective locations.
+        Repos are fetched through collector, serially if None.
         Returns: array of file names created
         """
-        rate_limit = self.get_api_rate_limit()
-        if rate_limit["rate"]["remaining"] < 100:
-            logging.warn(
-                "Not enough tokens to complete request. Waiting until token refresh to proceed."
-            )
-            # sleep until you have new tokens
-            d1 = datetime.datetime.now()
-            d2 = datetime.datetime.fromtimestamp(rate_limit["rate"]["reset"])
-            time.sleep((d2 - d1).seconds + self.sleep_time)
-        repo_list = self.get_repos(org)
+        # the governor paces requests from here on using the response headers
+        repo_list = self.inventory.repos(org)
+        # kinds of data due per repo, repos with nothing due are left out
+        due = {repo_info["name"]: None for repo_info in repo_list}
+        if self.scheduler is not None:
+            for repo_info in repo_list:
+                due[repo_info["name"]] = self.scheduler.due(
+                    org, repo_info, ["traffic", "stats"]
+                )
+            repo_list = [repo_info for repo_info in repo_list if due[repo_info["name"]]]
+        if run_lambda is True:
+            for repo_info in repo_list:
+                self.write_repo_traffic_to_s3(
+                    org, repo_info["name"], due[repo_info["name"]]
+                )
+            self.stats_scheduler.drain()
+            return []
+        if self.checkpoint is not None:
+            # written by an earlier run that was interrupted
+            repo_list = [
+                repo_info
+                for repo_info in repo_list
+                if not self.checkpoint.is_done("v3", f"{org}/{repo_info['name']}")
+            ]
+        if collector is None:
+            collector = Collector()
         repo_files = []
-        for repo_info in repo_list:
-            repo_name = repo_info["name"]
-            if run_lambda is False:
-                file_name = self.write_repo_traffic_to_disk(org, repo_name)
-                repo_files.append(file_name)
-            else:
-                self.write_repo_traffic_to_s3(org, repo_name)
+
+        def write_json(name, traffic):
+            def stored():
+                # not before, the sink may still be uploading or buffering it
+                if self.checkpoint is not None:
+                    self.checkpoint.mark_done("v3", f"{org}/{name}")
+                if self.scheduler is not None:
+                    self.scheduler.crawled(org, name, due[name], traffic=traffic)
+
+            return self.write_traffic_json(org, name, traffic, on_stored=stored)
+
+        def write(repo_info, traffic):
+            if traffic is None:
+                # failed and already logged, left for the next run or --resume
+                self.failed.append(f"{org}/{repo_info['name']}")
+                return
+            # held back by the scheduler while any of its stats are still 202
+            repo_files.extend(
+                self.stats_scheduler.submit(
+                    f"{org}/{repo_info['name']}",
+                    partial(write_json, repo_info["name"], traffic),
+                )
+            )
+
+        collector.run(
+            repo_list,
+            lambda repo_info: self.get_repo_traffic(
+                org, repo_info["name"], kinds=due[repo_info["name"]]
+            ),
+            write,
+        )
+        repo_files.extend(self.stats_scheduler.drain())
+        # writes that raised are left for the next run or --resume
+        self.failed.extend(sorted(self.stats_scheduler.failed))
+        self.stats_scheduler.discard()
         return repo_files
 
     def write_repo_traffic_to_disk(self, org, repo):
@@ -163,45 +395,92 @@ class GitHub_v3:
         Returns: file name of json written to disk
         """
         repo_info = self.get_repo_traffic(org, repo)
+        # wait for any stats GitHub was still computing
+        self.stats_scheduler.drain(f"{org}/{repo}")
+        return self.write_traffic_json(org, repo, repo_info)
+
+    def write_traffic_json(self, org, repo, repo_info, on_stored=None):
+        """
+        Write already fetched repo traffic to disk, on_stored is called once
+        the sink has stored it
+        Returns: file name of json written to disk
+        """
         curr_date = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-        file_name = f"{org}-{repo}-traffic-{curr_date}.json"
-        self.write_structured_json(file_name, repo_info)
+        file_name = self.write_structured_json(
+            f"{org}-{repo}-traffic-{curr_date}.json",
+            repo_info,
+            partial(traffic_records, org, repo, repo_info),
+            on_stored,
+        )
         logging.info(f"Traffic and stats for {org}/{repo} written to file {file_name}")
         return file_name
 
-    def write_repo_traffic_to_s3(self, org, repo):
+    def write_repo_traffic_to_s3(self, org, repo, kinds=None):
         """
-        Write repo traffic to S3
+        Write repo traffic to S3, only the "traffic" or "stats" in kinds if
+        given
 
         Note: Use print here as logging doesn't appear in CloudWatch output
         """
         print(f"Starting processing of {org}/{repo}")
-        # setup for storing in S3
-        s3 = boto3.resource("s3")
+        # setup for storing in S3, clients are thread safe but the default
+        # session isn't so without a shared client use a session per call
+        s3_client = self.s3_client
+        if s3_client is None:
+            s3_client = boto3.session.Session().client("s3")
         bucket_name = (
             "oss-datastore-staging"
         )  # TODO: convert to config file linked to .env
-        bucket = s3.Bucket(bucket_name)
         try:
             # now get repo info
-            repo_traffic = self.get_repo_traffic(org, repo, lambda_active=True)
+            repo_traffic = self.get_repo_traffic(
+                org, repo, lambda_active=True, kinds=kinds
+            )
         except GitHubV3Error:
             raise
+
+        def write():
+            self.put_traffic_to_s3(s3_client, bucket_name, org, repo, repo_traffic)
+            if self.scheduler is not None:
+                self.scheduler.crawled(
+                    org, repo, kinds or ("traffic", "stats"), traffic=repo_traffic
+                )
+            print(f"Processing of {org}/{repo} complete.")
+
+        # held back while any stats are still 202, call stats_scheduler.drain()
+        # once every repo in the batch has been submitted
+        self.stats_scheduler.submit(f"{org}/{repo}", write)
+
+    def put_traffic_to_s3(self, s3_client, bucket_name, org, repo, repo_traffic):
+        """
+        Put already fetched repo traffic into bucket_name
+        """
         curr_date_full = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
         curr_date = datetime.datetime.now().strftime("%Y-%m-%d")
         file_path_and_name = (
             f"{curr_date}/traffic/{org}-{repo}-traffic-{curr_date_full}.json"
         )
+        body = self.output_format.encode(
+            repo_traffic, partial(traffic_records, org, repo, repo_traffic)
+        )
         # write directly to S3
-        bucket.put_object(
-            Body=json.dumps(repo_traffic), Bucket=bucket_name, Key=file_path_and_name
+        upload_time = self.metrics.timer("Latency", Api="s3", Endpoint="put_object")
+        s3_client.put_object(
+            Body=body,
+            Bucket=bucket_name,
+            Key=self.output_format.key(file_path_and_name),
+            **self.output_format.s3_args(),
         )
-        print(f"Processing of {org}/{repo} complete.")
+        upload_time()
+        self.metrics.observe("BytesWritten", len(body), unit="Bytes", Sink="s3")
 
-    def get_repo_traffic(self, org, repo, lambda_active=False):
+    def get_repo_traffic(self, org, repo, lambda_active=False, kinds=None):
         """
         Get repo traffic info (referrers, paths, views, clones) for a repo.
-        Returns: JSON object of traffic data
+        kinds: "traffic" for the traffic endpoints and "stats" for the files
+               and /stats/* endpoints, both if None
+        Returns: JSON object of traffic data, without the keys of kinds that
+                 weren't requested
 
         Note: These sometimes fail the first request but there is no pagination.
               That being said, the retry takes care of getting the data since it
@@ -209,39 +488,93 @@ class GitHub_v3:
               the second request is almost always successful.
         """
         logging.info(f"Getting traffic and stats for {org}/{repo}")
+        repo_time = self.metrics.timer("RepoTime", Api="rest")
         # traffic info found https://developer.github.com/v3/repos/traffic/
-        repo_info = {}
+        traffic_calls = [
+            ("referrers", self.get_referrers),
+            ("paths", self.get_paths),
+            ("views", self.get_views),
+            ("clones", self.get_clones),
+        ]
+        # the file list only changes with pushes, like the stats
+        file_calls = [("repo_file_names", self.get_files)]
+        # stats info found https://developer.github.com/v3/repos/statistics/
+        stats_calls = [
+            ("contributors", self.get_stats_contributors),
+            ("commit_activity", self.get_stats_commit_activity),
+            ("code_frequency", self.get_stats_code_frequency),
+            ("participation", self.get_stats_participation),
+            ("punch_card", self.get_stats_punch_card),
+        ]
+        # stats answering 202 are re-polled later by the stats scheduler
+        accepted = []
+        if self.stats_scheduler.max_attempts > 0:
+            stats_calls = [
+                (name, partial(getter, accepted=accepted.append))
+                for name, getter in stats_calls
+            ]
+        if kinds is None:
+            kinds = ("traffic", "stats")
+        if "traffic" not in kinds:
+            traffic_calls = []
+        if "stats" not in kinds:
+            file_calls = stats_calls = []
         try:
-            repo_info["repo_file_names"] = self.get_files(org, repo)
-            repo_info["referrers"] = self.get_referrers(org, repo)
-            repo_info["paths"] = self.get_paths(org, repo)
-            repo_info["views"] = self.get_views(org, repo)
-            repo_info["clones"] = self.get_clones(org, repo)
-            # stats info found https://developer.github.com/v3/repos/statistics/
-            repo_info["stats"] = {}
-            repo_info["stats"]["contributors"] = self.get_stats_contributors(org, repo)
-            repo_info["stats"]["commit_activity"] = self.get_stats_commit_activity(
-                org, repo
-            )
-            repo_info["stats"]["code_frequency"] = self.get_stats_code_frequency(
-                org, repo
+            results = self.call_repo_endpoints(
+                org, repo, file_calls + traffic_calls + stats_calls
             )
-            repo_info["stats"]["participation"] = self.get_stats_participation(
-                org, repo
-            )
-            repo_info["stats"]["punch_card"] = self.get_stats_punch_card(org, repo)
-
-            return repo_info
         except GitHubV3Error as e:
             # log critical error
             logging.critical(e.args)
             if lambda_active is True:
                 raise
             # not going to raise we need it to move onto the next repo
+            return None
+        repo_info = {name: results[name] for name, _ in file_calls + traffic_calls}
+        if "stats" in kinds:
+            repo_info["stats"] = {name: results[name] for name, _ in stats_calls}
+        for query in accepted:
+            self.stats_scheduler.defer(f"{org}/{repo}", repo_info, query)
+        repo_time()
+        return repo_info
+
+    def call_repo_endpoints(self, org, repo, calls):
+        """
+        Run every (name, getter) pair in calls against the repo, concurrently
+        when endpoint_workers is above 1.
+        Returns: dict of name to response body
+        """
+        if self.endpoint_workers == 1:
+            return {name: getter(org, repo) for name, getter in calls}
+        with ThreadPoolExecutor(max_workers=self.endpoint_workers) as pool:
+            futures = [(name, pool.submit(getter, org, repo)) for name, getter in calls]
+        # every call has finished here, result() re-raises the first failure
+        return {name: future.result() for name, future in futures}
 
     def get_repos(self, org):
         return self.github_v3_run_query(f"/orgs/{org}/repos")
 
+    def list_org_repos(self, org):
+        """
+        get_repos with the fields GitHub_Common.RepoInventory keeps, named
+        the way the v4 API names them
+        Returns: array of repo dicts
+        """
+        return [
+            {
+                "id": repo.get("node_id"),
+                "name": repo["name"],
+                "nameWithOwner": repo["full_name"],
+                "isArchived": repo.get("archived", False),
+                "isFork": repo.get("fork", False),
+                "pushedAt": repo.get("pushed_at"),
+                "visibility": repo.get(
+                    "visibility", "private" if repo.get("private") else "public"
+                ).upper(),
+            }
+            for repo in self.get_repos(org) or []
+        ]
+
     def get_files(self, org, repo):
         return self.github_v3_run_query(f"/repos/{org}/{repo}/contents")
 
@@ -259,17 +592,27 @@ class GitHub_v3:
     def get_clones(self, org, repo):
         return self.github_v3_run_query(f"/repos/{org}/{repo}/traffic/clones")
 
-    def get_stats_contributors(self, org, repo):
-        return self.github_v3_run_query(f"/repos/{org}/{repo}/stats/contributors")
+    def get_stats_contributors(self, org, repo, accepted=None):
+        return self.github_v3_run_query(
+            f"/repos/{org}/{repo}/stats/contributors", accepted=accepted
+        )
 
-    def get_stats_commit_activity(self, org, repo):
-        return self.github_v3_run_query(f"/repos/{org}/{repo}/stats/commit_activity")
+    def get_stats_commit_activity(self, org, repo, accepted=None):
+        return self.github_v3_run_query(
+            f"/repos/{org}/{repo}/stats/commit_activity", accepted=accepted
+        )
 
-    def get_stats_code_frequency(self, org, repo):
-        return self.github_v3_run_query(f"/repos/{org}/{repo}/stats/code_frequency")
+    def get_stats_code_frequency(self, org, repo, accepted=None):
+        return self.github_v3_run_query(
+            f"/repos/{org}/{repo}/stats/code_frequency", accepted=accepted
+        )
 
-    def get_stats_participation(self, org, repo):
-        return self.github_v3_run_query(f"/repos/{org}/{repo}/stats/participation")
+    def get_stats_participation(self, org, repo, accepted=None):
+        return self.github_v3_run_query(
+            f"/repos/{org}/{repo}/stats/participation", accepted=accepted
+        )
 
-    def get_stats_punch_card(self, org, repo):
-        return self.github_v3_run_query(f"/repos/{org}/{repo}/stats/punch_card")
+    def get_stats_punch_card(self, org, repo, accepted=None):
+        return self.github_v3_run_query(
+            f"/repos/{org}/{repo}/stats/punch_card", accepted=accepted
+        )
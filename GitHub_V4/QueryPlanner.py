@@ -0,0 +1,97 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import re
+import threading
+
+# a field with arguments opening a selection, "{" or "}"
+TOKENS = re.compile(r"\w+\s*\(([^)]*)\)\s*\{|\{|\}")
+# first: 100 or first: $first, but not the $first: Int! declaration
+FIRST = re.compile(r"(?<![\$\w])first:\s*(\$?\w+)")
+
+
+def estimate_cost(query, variables):
+    """
+    GitHub's published formula: every connection takes one request per node
+    of the connections it is nested in, the total divided by 100 and rounded
+    is the point cost, at least 1
+    Returns: estimated point cost of query
+    """
+    requests = 0
+    # product of the first arguments of the enclosing connections
+    nodes = [1]
+    for match in TOKENS.finditer(query):
+        token = match.group(0)
+        if token == "}":
+            if len(nodes) > 1:
+                nodes.pop()
+            continue
+        size = None
+        if match.group(1) is not None:
+            first = FIRST.search(match.group(1))
+            if first is not None:
+                value = first.group(1)
+                if value.startswith("$"):
+                    value = variables.get(value[1:])
+                try:
+                    size = int(value)
+                except (TypeError, ValueError):
+                    size = None
+        if size is None:
+            nodes.append(nodes[-1])
+        else:
+            requests += nodes[-1]
+            nodes.append(nodes[-1] * size)
+    return max(1, int(round(requests / 100)))
+
+
+class QueryPlanner:
+    def __init__(self, page_size=100):
+        """
+        Keeps the estimated and actual point cost per query. The
+        vulnerabilityAlerts page size stays at page_size: smaller pages cost
+        the same points per page, so shrinking them only adds queries.
+        """
+        self.page_size = page_size
+        self.costs = {}  # query name -> [queries, estimated, actual]
+        self.lock = threading.Lock()
+
+    def alerts_page_size(self):
+        """
+        Returns: the $first to request vulnerabilityAlerts with
+        """
+        return self.page_size
+
+    def record(self, name, query, variables, actual):
+        """
+        Record the cost GitHub charged for query
+        Returns: the estimated cost
+        """
+        estimated = estimate_cost(query, variables)
+        with self.lock:
+            costs = self.costs.setdefault(name, [0, 0, 0])
+            costs[0] += 1
+            costs[1] += estimated
+            costs[2] += actual
+        return estimated
+
+    def report(self):
+        """
+        Returns: dict of query name to its number of queries and their total
+                 estimated and actual point cost
+        """
+        with self.lock:
+            return {
+                name: {"queries": queries, "estimated": estimated, "actual": actual}
+                for name, (queries, estimated, actual) in sorted(self.costs.items())
+            }
@@ -12,16 +12,32 @@
 # permissions and limitations under the License.
 
 
+# optional groups of repo fields, vulnerability alerts are always fetched
+FIELD_GROUPS = ("counts", "languages")
+
+
 class Repo:
-    def __init__(self):
+    def __init__(self, field_groups=None):
+        """
+        Contains the graphql query structure for getting all repo information
+        for an org.
+
+        field_groups: which of FIELD_GROUPS repo queries select, all of them if None
         """
-      Contains the graphql query structure for getting all repo information
-      for an org.
-      """
+        if field_groups is None:
+            field_groups = FIELD_GROUPS
+        unknown = set(field_groups) - set(FIELD_GROUPS)
+        if unknown:
+            raise ValueError(
+                f"Unknown field groups {', '.join(sorted(unknown))}, "
+                f"expected some of {', '.join(FIELD_GROUPS)}"
+            )
+        self.field_groups = tuple(field_groups)
 
     def get_full_org_repos(self):
         query = f"""
             query($login: String!, $first: Int!, $after: String) {{
+              {self.get_rate_limit_fields()}
               organization(login: $login) {{
                 repositories(first: $first after: $after) {{
                   edges {{
@@ -30,6 +46,10 @@ class Repo:
                       id
                       name
                       nameWithOwner
+                      isArchived
+                      isFork
+                      pushedAt
+                      visibility
                     }}
                   }}
                   pageInfo {{
@@ -46,23 +66,105 @@ class Repo:
     def get_repo_info_query(self):
         query = f"""
             query($org_name: String!, $repo_name: String!, $first: Int!, $after: String) {{
+              {self.get_rate_limit_fields()}
               organization(login: $org_name) {{
                 repository(name: $repo_name) {{
-                  forks(first: 100) {{
-                    totalCount
-                  }}
-                  issues(first: 100) {{
-                    totalCount
-                  }}
+                  {self.get_repo_count_fields()}
+                  {self.get_vulnerability_alerts_fields("$after")}
+                }}
+              }}
+            }}
+        """
+        return query
+
+    def get_repo_batch_query(self, repo_count, alerts_only=False):
+        """
+        Aliased query fetching repo_count repos of one org in a single request.
+        Repo names are passed as $repo0..$repoN and alert cursors as
+        $after0..$afterN, results come back under the aliases repo0..repoN.
+        With alerts_only only the next page of vulnerabilityAlerts is fetched.
+        """
+        arguments = ["$org_name: String!", "$first: Int!"]
+        repositories = []
+        for index in range(repo_count):
+            arguments.append(f"$repo{index}: String!")
+            arguments.append(f"$after{index}: String")
+            fields = self.get_vulnerability_alerts_fields(f"$after{index}")
+            if alerts_only:
+                fields = "name" + fields
+            else:
+                fields = self.get_repo_count_fields() + fields
+            repositories.append(
+                f"""
+                repo{index}: repository(name: $repo{index}) {{
+                  {fields}
+                }}"""
+            )
+        arguments = ", ".join(arguments)
+        repositories = "".join(repositories)
+        query = f"""
+            query({arguments}) {{
+              {self.get_rate_limit_fields()}
+              organization(login: $org_name) {{
+                {repositories}
+              }}
+            }}
+        """
+        return query
+
+    def get_rate_limit_fields(self):
+        fields = f"""
+              rateLimit {{
+                cost
+                remaining
+                resetAt
+              }}
+        """
+        return fields
+
+    def get_repo_count_fields(self):
+        """
+        Only totalCount is read from the count connections, without a first
+        argument they add nothing to the query's point cost
+        Returns: the repo fields of the selected field groups
+        """
+        fields = """
                   name
                   nameWithOwner
-                  pullRequests(first: 100) {{
+        """
+        if "counts" in self.field_groups:
+            fields += """
+                  forks {
                     totalCount
-                  }}
-                  stargazers (first: 100) {{
+                  }
+                  issues {
                     totalCount
-                  }}
-                  vulnerabilityAlerts (first: $first after: $after) {{
+                  }
+                  pullRequests {
+                    totalCount
+                  }
+                  stargazers {
+                    totalCount
+                  }
+                  watchers {
+                    totalCount
+                  }
+            """
+        if "languages" in self.field_groups:
+            fields += """
+                  languages (first: 100) {
+                    edges {
+                      node {
+                        name
+                      }
+                    }
+                  }
+            """
+        return fields
+
+    def get_vulnerability_alerts_fields(self, after):
+        fields = f"""
+                  vulnerabilityAlerts (first: $first after: {after}) {{
                     edges {{
                       node {{
                         createdAt
@@ -112,18 +214,5 @@ class Repo:
                       hasNextPage
                     }}
                   }}
-                  watchers (first: 100) {{
-                    totalCount
-                  }}
-                  languages (first: 100) {{
-                    edges {{
-                      node {{
-                        name
-                      }}
-                    }}
-                  }}
-                }}
-              }}
-            }}
         """
-        return query
+        return fields
@@ -13,13 +13,23 @@
 
 import boto3
 import datetime
-import json
 import logging
 import os
-import requests
 import time
 
+from .QueryPlanner import QueryPlanner
 from .Repo import Repo
+from functools import partial
+from GitHub_Common import (
+    Collector,
+    DiskSink,
+    Metrics,
+    OutputFormat,
+    RepoInventory,
+    TokenPool,
+    Transport,
+)
+from GitHub_Common.Records import repo_records
 
 
 class GitHubV4Error(RuntimeError):
@@ -29,67 +39,175 @@ class GitHubV4Error(RuntimeError):
 
 class GitHub_v4:
     # functions
-    def __init__(self, token):
+    def __init__(
+        self,
+        token,
+        transport=None,
+        batch_size=None,
+        governor=None,
+        state_store=None,
+        full_sync_days=None,
+        sink=None,
+        output_format=None,
+        s3_client=None,
+        checkpoint=None,
+        metrics=None,
+        field_groups=None,
+        planner=None,
+        inventory=None,
+        scheduler=None,
+    ):
         """
         Contains the graphql query structure for getting information for an org.
+
+        token: a token, comma separated tokens, a list of them or a
+               GitHub_Common.TokenPool
+        transport: shared GitHub_Common.Transport, a new one is created if None
+        governor: shared GitHub_Common.RateLimitGovernor used when token isn't
+                  already a TokenPool, a new one is created if None
+        batch_size: repos fetched per aliased query, read from
+                    GITHUB_GRAPHQL_BATCH if None
+        state_store: optional GitHub_Common state store, turns on incremental
+                     vulnerability alert sync (see sync_data_for_repos)
+        full_sync_days: days between full alert snapshots in incremental
+                        mode, read from GITHUB_ALERT_FULL_SYNC_DAYS if None
+        sink: where repo documents are written, a GitHub_Common.DiskSink
+              under output/ if None
+        output_format: GitHub_Common.OutputFormat for the Lambda S3 writer,
+                       compact JSON unless GITHUB_OUTPUT_FORMAT is set
+        s3_client: boto3 S3 client reused by the Lambda S3 writer, a new one
+                   is created per repo if None
+        checkpoint: optional GitHub_Common.Checkpoint, repos already written
+                    are skipped and paginated queries resume where they left off
+        metrics: shared GitHub_Common.Metrics recording requests, latency,
+                 retries, GraphQL cost, bytes written and per-repo time
+        field_groups: repo fields to fetch besides vulnerability alerts, any
+                      of "counts" and "languages", read from comma separated
+                      GITHUB_GRAPHQL_FIELDS if None, all of them if unset
+        planner: QueryPlanner estimating and recording the point cost of each
+                 query, a new one is created if None
+        inventory: GitHub_Common.RepoInventory the org repo lists are read
+                   from, one listing with get_org_repo_list if None. Pass it
+                   to GitHub_v3 so orgs are only listed once.
+        scheduler: optional GitHub_Common.CrawlScheduler, only repos whose
+                   alerts are due are requested
         """
         # initialize dependencies
+        self.transport = transport if transport is not None else Transport()
         self.github_v4_url = "https://api.github.com/graphql"
+        # Authorization is added per request from the token pool
         self.github_v4_cve_headers = {
-            "Accept": "application/vnd.github.vixen-preview+json",
-            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github.vixen-preview+json"
         }
-        self.github_v4_normal_headers = {"Authorization": f"token {token}"}
+        self.github_v4_normal_headers = {}
         self.sleep_time = 16  # number of seconds to sleep
         self.max_retry_count = 5
-        self.repo = Repo()
+        if field_groups is None and os.getenv("GITHUB_GRAPHQL_FIELDS"):
+            field_groups = os.getenv("GITHUB_GRAPHQL_FIELDS").split(",")
+        self.repo = Repo(field_groups)
+        self.planner = planner if planner is not None else QueryPlanner()
+        if inventory is None:
+            inventory = RepoInventory(self.get_org_repo_list)
+        self.inventory = inventory
+        self.scheduler = scheduler
+        if batch_size is None:
+            batch_size = int(os.getenv("GITHUB_GRAPHQL_BATCH") or "1")
+        self.batch_size = max(1, batch_size)
+        # shared by every worker and client using the same tokens
+        if not isinstance(token, TokenPool):
+            token = TokenPool(token, governor)
+        self.token_pool = token
+        self.state_store = state_store
+        if full_sync_days is None:
+            full_sync_days = int(os.getenv("GITHUB_ALERT_FULL_SYNC_DAYS") or "7")
+        self.full_sync_days = full_sync_days
+        self.sink = sink if sink is not None else DiskSink()
+        if output_format is None:
+            output_format = OutputFormat(os.getenv("GITHUB_OUTPUT_FORMAT") or "compact")
+        self.output_format = output_format
+        self.s3_client = s3_client
+        self.checkpoint = checkpoint
+        self.metrics = metrics if metrics is not None else Metrics()
+        # org/repo names write_data_for_org_disk couldn't collect
+        self.failed = []
 
-    def write_structured_json(self, file_name, json_obj):
-        file_path = None
+    def write_structured_json(
+        self, file_name, json_obj, folder="repo", records=None, on_stored=None
+    ):
+        """
+        Writes json blob (json_obj) to file_name under folder in the sink,
+        on_stored is called once the sink has stored it
+        Returns: file name with the sink's output format extension
+        """
         curr_date = datetime.datetime.now().strftime("%Y-%m-%d")
-        os.makedirs(f"output/{curr_date}/repo", exist_ok=True)
-        file_path = f"output/{curr_date}/repo/{file_name}"
-        with open(f"{file_path}", "wt") as f:
-            json.dump(json_obj, f, sort_keys=True, indent=2)
+        key = self.sink.write(
+            f"{curr_date}/{folder}/{file_name}", json_obj, records, on_stored
+        )
+        return key.rsplit("/", 1)[-1]
 
     def make_graphql_query(self, query, variables, headers):
         """
         Makes queries to the graphql API and handles pagination
         """
-        # ensure you have enough tokens before proceeding
-        rate_query = """
-          query {
-            rateLimit {
-              limit
-              cost
-              remaining
-              resetAt
-            }
-          }
-        """
-        response = requests.post(
-            self.github_v4_url, json={"query": rate_query}, headers=headers
-        )
-        rate_limit = response.json()
-        if rate_limit["data"]["rateLimit"]["remaining"] < 100:
-            logging.warn(
-                "Not enough tokens to complete request. Waiting until token refresh to proceed."
-            )
-            # sleep until you have new tokens
-            d1 = datetime.datetime.now()
-            d2 = datetime.datetime.strptime(
-                rate_limit["data"]["rateLimit"]["resetAt"], "%Y-%m-%dT%H-%M-%SZ"
-            )
-            time.sleep((d2 - d1).seconds + self.sleep_time)
-
+        endpoint = self.query_name(query)
         for count in range(1, self.max_retry_count + 1):
-            response = requests.post(
+            # waits here if every token's budget is spent
+            token = self.token_pool.acquire("graphql")
+            request_time = self.metrics.timer(
+                "Latency", Api="graphql", Endpoint=endpoint
+            )
+            response = self.transport.post(
                 self.github_v4_url,
                 json={"query": query, "variables": variables},
-                headers=headers,
+                headers=self.token_pool.headers(token, headers),
+            )
+            request_time()
+            self.metrics.increment(
+                "Requests",
+                Api="graphql",
+                Endpoint=endpoint,
+                Status=str(response.status_code),
             )
+            self.token_pool.update_from_headers("graphql", token, response.headers)
+            if self.token_pool.throttled("graphql", token, response):
+                self.metrics.increment(
+                    "Retries", Api="graphql", Endpoint=endpoint, Reason="throttled"
+                )
+                continue
             if response.status_code == 200:
-                return response.json()
+                body = response.json()
+                data = body.get("data") or {}
+                if "rateLimit" in data:
+                    # queries ask for their own cost inline, keep it out of
+                    # the stored data
+                    rate_limit = data.pop("rateLimit")
+                    self.token_pool.update_from_graphql("graphql", token, rate_limit)
+                    self.metrics.observe(
+                        "GraphQLCost",
+                        rate_limit["cost"],
+                        unit="Count",
+                        Endpoint=endpoint,
+                    )
+                    estimated = self.planner.record(
+                        endpoint, query, variables, rate_limit["cost"]
+                    )
+                    self.metrics.observe(
+                        "GraphQLCostEstimate",
+                        estimated,
+                        unit="Count",
+                        Endpoint=endpoint,
+                    )
+                errors = body.get("errors") or []
+                if any(error.get("type") == "RATE_LIMITED" for error in errors):
+                    self.metrics.increment(
+                        "Retries",
+                        Api="graphql",
+                        Endpoint=endpoint,
+                        Reason="rate_limited",
+                    )
+                    self.token_pool.block("graphql", token, self.sleep_time)
+                    continue
+                return body
             elif 400 <= response.status_code < 500:
                 # client error
                 # raise exception
@@ -102,6 +220,12 @@ class GitHub_v4:
                     msg = f"Server error when requesting: {query} {variables} {headers}  and got response: {response}"
                     raise GitHubV4Error(msg)
                 else:
+                    self.metrics.increment(
+                        "Retries",
+                        Api="graphql",
+                        Endpoint=endpoint,
+                        Reason="server_error",
+                    )
                     logging.warn(
                         f"Request failed, retrying in {self.sleep_time} seconds. Number of recounts left: {self.max_retry_count - count}"
                     )
@@ -110,36 +234,114 @@ class GitHub_v4:
                 # some other error
                 msg = f"Error when requesting: {query} {variables} {headers} and got response: {response}"
                 raise GitHubV4Error(msg)
+        msg = f"Rate limited on every retry when requesting: {query} {variables}"
+        raise GitHubV4Error(msg)
 
-    def write_data_for_org_disk(self, org):
+    def query_name(self, query):
         """
-        Get the CVE information for the current org and write them to file
+        The queries are unnamed, tell them apart by their shape
+        Returns: name to record query metrics under
+        """
+        if "repositories(" in query:
+            return "org_repos"
+        if "repo0:" in query:
+            return "repo_batch"
+        return "repo"
+
+    def write_data_for_org_disk(self, org, collector=None):
+        """
+        Get the CVE information for the current org and write them to file.
+        Repos are fetched through collector, serially if None.
         Returns: Array of file names created
         """
         try:
-            repo_list = self.get_org_repo_list(org)
+            repo_list = self.inventory.repos(org)
         except GitHubV4Error:
             # log critical error
             msg = f"Failed to get list of repos for org {org}."
             logging.critical(msg)
             # raise exception
             raise
-        file_list = []
-        for repo_info in repo_list:
-            logging.info(f"Getting data for {org}/{repo_info['name']}")
+        if self.checkpoint is not None:
+            # written by an earlier run that was interrupted
+            repo_list = [
+                repo_info
+                for repo_info in repo_list
+                if not self.checkpoint.is_done("v4", f"{org}/{repo_info['name']}")
+            ]
+        if self.scheduler is not None:
+            repo_list = [
+                repo_info
+                for repo_info in repo_list
+                if self.scheduler.due(org, repo_info, ["alerts"])
+            ]
+
+        def fetch(batch):
+            names = [repo_info["name"] for repo_info in batch]
+            logging.info(f"Getting data for {org}/{', '.join(names)}")
+            if self.state_store is not None:
+                return self.sync_data_for_repos(org, names)
+            if len(names) > 1:
+                repo_cves = self.get_data_for_repos(org, names)
+                return {name: ("full", cve) for name, cve in repo_cves.items()}
             try:
-                repo_cve = self.get_data_for_repo(org, repo_info["name"])
+                return {names[0]: ("full", self.get_data_for_repo(org, names[0]))}
             except GitHubV4Error:
-                msg = f"Failed to get data for {org}/{repo_info['name']}"
+                msg = f"Failed to get data for {org}/{names[0]}"
                 logging.critical(msg)
                 # don't raise, continue to try the next repo
-                continue
-            currDate = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-            file_name = f"{org}-{repo_info['name']}-data-{currDate}.json"
-            self.write_structured_json(file_name, repo_cve)
-            msg = f"Data for {org}/{repo_info['name']} written to {file_name}"
-            logging.info(msg)
-            file_list.append(file_name)
+                return {}
+
+        def stored_repo(repo_name, kind, repo_cve):
+            self.save_alert_state(org, repo_name, kind, repo_cve)
+            if self.checkpoint is not None:
+                self.checkpoint.mark_done("v4", f"{org}/{repo_name}")
+            if self.scheduler is not None:
+                self.scheduler.crawled(
+                    org, repo_name, ["alerts"], alerts=(kind, repo_cve)
+                )
+
+        def write(batch, repo_cves):
+            file_list = []
+            for repo_info in batch:
+                if repo_info["name"] not in repo_cves:
+                    # failed and already logged, left for the next run or --resume
+                    self.failed.append(f"{org}/{repo_info['name']}")
+            for repo_name, (kind, repo_cve) in repo_cves.items():
+                currDate = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+                records = partial(repo_records, org, repo_name, repo_cve)
+                # only move the high-water mark once the data is stored, the
+                # sink may still be uploading or buffering it after write
+                stored = partial(stored_repo, repo_name, kind, repo_cve)
+                if kind == "delta":
+                    file_name = self.write_structured_json(
+                        f"{org}-{repo_name}-delta-{currDate}.json",
+                        repo_cve,
+                        "repo-delta",
+                        records,
+                        stored,
+                    )
+                else:
+                    file_name = self.write_structured_json(
+                        f"{org}-{repo_name}-data-{currDate}.json",
+                        repo_cve,
+                        records=records,
+                        on_stored=stored,
+                    )
+                msg = f"Data for {org}/{repo_name} written to {file_name}"
+                logging.info(msg)
+                file_list.append(file_name)
+            return file_list
+
+        batches = [
+            repo_list[start : start + self.batch_size]
+            for start in range(0, len(repo_list), self.batch_size)
+        ]
+        if collector is None:
+            collector = Collector()
+        file_list = []
+        for batch_files in collector.run(batches, fetch, write):
+            file_list.extend(batch_files)
         return file_list
 
     def write_repo_traffic_to_s3(self, org, repo):
@@ -149,13 +351,22 @@ class GitHub_v4:
         Note: Use print here as logging doesn't appear in CloudWatch output
         """
         print(f"Starting processing of {org}/{repo}")
-        # setup for storing in S3
-        s3 = boto3.resource("s3")
+        # setup for storing in S3, clients are thread safe but the default
+        # session isn't so without a shared client use a session per call
+        s3_client = self.s3_client
+        if s3_client is None:
+            s3_client = boto3.session.Session().client("s3")
         bucket_name = "oss-datastore-staging"
-        bucket = s3.Bucket(bucket_name)
+        kind = "full"
         try:
             # now get repo info
-            repo_traffic = self.get_data_for_repo(org, repo)
+            if self.state_store is not None:
+                synced = self.sync_data_for_repos(org, [repo])
+                if repo not in synced:
+                    raise GitHubV4Error(f"Failed to get data for {org}/{repo}")
+                kind, repo_traffic = synced[repo]
+            else:
+                repo_traffic = self.get_data_for_repo(org, repo)
         except GitHubV4Error:
             raise
         curr_date_full = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
@@ -163,10 +374,26 @@ class GitHub_v4:
         file_path_and_name = (
             f"{curr_date}/cve/{org}-{repo}-traffic-{curr_date_full}.json"
         )
+        if kind == "delta":
+            file_path_and_name = (
+                f"{curr_date}/cve-delta/{org}-{repo}-delta-{curr_date_full}.json"
+            )
+        body = self.output_format.encode(
+            repo_traffic, partial(repo_records, org, repo, repo_traffic)
+        )
         # write directly to S3
-        bucket.put_object(
-            Body=json.dumps(repo_traffic), Bucket=bucket_name, Key=file_path_and_name
+        upload_time = self.metrics.timer("Latency", Api="s3", Endpoint="put_object")
+        s3_client.put_object(
+            Body=body,
+            Bucket=bucket_name,
+            Key=self.output_format.key(file_path_and_name),
+            **self.output_format.s3_args(),
         )
+        upload_time()
+        self.metrics.observe("BytesWritten", len(body), unit="Bytes", Sink="s3")
+        self.save_alert_state(org, repo, kind, repo_traffic)
+        if self.scheduler is not None:
+            self.scheduler.crawled(org, repo, ["alerts"], alerts=(kind, repo_traffic))
         print(f"Processing of {org}/{repo} complete.")
 
     def get_data_for_repo(
@@ -174,52 +401,24 @@ class GitHub_v4:
     ):
         """
         Get paginated data for a repo
-        Returns: full paginated contents of data for a repo 
+        Returns: full paginated contents of data for a repo
         """
-        query = self.repo.get_repo_info_query()
-        variables = {"org_name": org, "repo_name": repo, "first": 100}
+        repo_time = self.metrics.timer("RepoTime", Api="graphql")
         try:
-            response = self.make_graphql_query(
-                query, variables, self.github_v4_cve_headers
-            )
-            page_info = response["data"]["organization"]["repository"][
+            pages = self.get_data_pages_for_repo(org, repo)
+            response = next(pages)
+            alerts = response["data"]["organization"]["repository"][
                 "vulnerabilityAlerts"
-            ]["pageInfo"]
-            # handle pagination for graphql
-            while page_info["hasNextPage"]:
-                # setuip query to get desired data with current cursor
-                query = self.repo.get_repo_info_query()
-                variables = {
-                    "org_name": org,
-                    "repo_name": repo,
-                    "first": 100,
-                    "after": page_info["endCursor"],
-                }
-                # make a request to the GitHub API
-                pages = self.make_graphql_query(
-                    query, variables, self.github_v4_cve_headers
-                )
-                # merge new data with the previous data
-                edges = (
-                    response["data"]["organization"]["repository"][
-                        "vulnerabilityAlerts"
-                    ]["edges"]
-                    + pages["data"]["organization"]["repository"][
-                        "vulnerabilityAlerts"
-                    ]["edges"]
-                )
-                # replace previous data with newer and more complete data
-                response["data"]["organization"]["repository"]["vulnerabilityAlerts"][
-                    "edges"
-                ] = edges
-                # update page_info for tracking in the loop
-                page_info = pages["data"]["organization"]["repository"][
+            ]
+            for page in pages:
+                page_alerts = page["data"]["organization"]["repository"][
                     "vulnerabilityAlerts"
-                ]["pageInfo"]
-            # store final page_info in the request for storage
-            response["data"]["organization"]["repository"]["vulnerabilityAlerts"][
-                "pageInfo"
-            ] = page_info
+                ]
+                # merge new data into the first page in place
+                alerts["edges"].extend(page_alerts["edges"])
+                # store final page_info in the request for storage
+                alerts["pageInfo"] = page_alerts["pageInfo"]
+            repo_time()
             # return all paginated data
             return response
         except GitHubV4Error as e:
@@ -227,21 +426,206 @@ class GitHub_v4:
             logging.critical(e.args)
             raise
 
+    def get_data_pages_for_repo(self, org, repo):
+        """
+        Generator over the pages of data for a repo, one GraphQL response per
+        page of vulnerability alerts. Only one page is held at a time so
+        callers that stream the alerts never build the full list.
+        Returns: iterator of responses
+        """
+        query = self.repo.get_repo_info_query()
+        variables = {"org_name": org, "repo_name": repo}
+        scope = f"v4/alerts/{org}/{repo}"
+        pages, cursor = [], None
+        if self.checkpoint is not None:
+            # pages fetched before an interrupted run are replayed
+            pages, cursor = self.checkpoint.load_pages(scope)
+            yield from pages
+        index = len(pages)
+        if cursor is not None:
+            variables = dict(variables, after=cursor)
+        while True:
+            variables["first"] = self.planner.alerts_page_size()
+            # make a request to the GitHub API
+            page = self.make_graphql_query(query, variables, self.github_v4_cve_headers)
+            page_info = page["data"]["organization"]["repository"][
+                "vulnerabilityAlerts"
+            ]["pageInfo"]
+            if self.checkpoint is not None and page_info["hasNextPage"]:
+                self.checkpoint.save_page(scope, index, page, page_info["endCursor"])
+            index += 1
+            yield page
+            # handle pagination for graphql
+            if not page_info["hasNextPage"]:
+                if self.checkpoint is not None:
+                    self.checkpoint.clear_pages(scope)
+                return
+            # setup query to get desired data with current cursor
+            variables = dict(variables, after=page_info["endCursor"])
+
+    def get_data_for_repos(self, org, repos, cursors=None):
+        """
+        Get paginated data for several repos of an org, batch_size repos per
+        aliased query. Follow-up alert pages are only requested for repos that
+        still have a next page. cursors optionally maps repo names to the
+        alert cursor to start after.
+        Returns: dict of repo name to the same response get_data_for_repo
+                 returns, repos that failed are logged and left out
+        """
+        results = {}
+        for start in range(0, len(repos), self.batch_size):
+            batch = repos[start : start + self.batch_size]
+            try:
+                results.update(self.get_data_for_repo_batch(org, batch, cursors))
+            except GitHubV4Error as e:
+                logging.critical(e.args)
+                msg = f"Failed to get data for {org}/{', '.join(batch)}"
+                logging.critical(msg)
+                # don't raise, continue to try the next batch
+        return results
+
+    def get_data_for_repo_batch(self, org, repos, cursors=None):
+        """
+        Get paginated data for up to batch_size repos with one aliased query
+        per page
+        Returns: dict of repo name to the same response get_data_for_repo returns
+        """
+        start = time.perf_counter()
+        query = self.repo.get_repo_batch_query(len(repos))
+        variables = {"org_name": org, "first": self.planner.alerts_page_size()}
+        for index, repo in enumerate(repos):
+            variables[f"repo{index}"] = repo
+            if cursors is not None:
+                variables[f"after{index}"] = cursors.get(repo)
+        organization = self.get_batch_organization(query, variables)
+        results = {}
+        for index, repo in enumerate(repos):
+            repository = organization.get(f"repo{index}")
+            if repository is None:
+                logging.critical(f"Failed to get data for {org}/{repo}")
+                continue
+            results[repo] = {"data": {"organization": {"repository": repository}}}
+
+        def alerts(repo):
+            return results[repo]["data"]["organization"]["repository"][
+                "vulnerabilityAlerts"
+            ]
+
+        # handle pagination only for the repos that have more alerts
+        paging = [repo for repo in results if alerts(repo)["pageInfo"]["hasNextPage"]]
+        while paging:
+            query = self.repo.get_repo_batch_query(len(paging), alerts_only=True)
+            variables = {"org_name": org, "first": self.planner.alerts_page_size()}
+            for index, repo in enumerate(paging):
+                variables[f"repo{index}"] = repo
+                variables[f"after{index}"] = alerts(repo)["pageInfo"]["endCursor"]
+            organization = self.get_batch_organization(query, variables)
+            next_paging = []
+            for index, repo in enumerate(paging):
+                repository = organization.get(f"repo{index}")
+                if repository is None:
+                    logging.critical(f"Failed to get data for {org}/{repo}")
+                    del results[repo]
+                    continue
+                page = repository["vulnerabilityAlerts"]
+                # extend in place, store the final page_info for storage
+                alerts(repo)["edges"].extend(page["edges"])
+                alerts(repo)["pageInfo"] = page["pageInfo"]
+                if page["pageInfo"]["hasNextPage"]:
+                    next_paging.append(repo)
+            paging = next_paging
+        # the repos share their requests, split the batch's time between them
+        elapsed = (time.perf_counter() - start) * 1000 / max(1, len(repos))
+        for _ in repos:
+            self.metrics.observe("RepoTime", elapsed, Api="graphql")
+        return results
+
+    def sync_data_for_repos(self, org, repos):
+        """
+        Incremental variant of get_data_for_repos. Each repo's last alert
+        cursor is kept in state_store and only alerts after it are fetched.
+        Counts and languages are always current. A full snapshot is taken the
+        first time a repo is seen and every full_sync_days after that, which
+        also picks up dismissals of older alerts.
+        Returns: dict of repo name to (kind, response), kind is "full" or
+                 "delta". Call save_alert_state once a response is stored.
+        """
+        today = datetime.date.today()
+        full = []
+        cursors = {}
+        for repo in repos:
+            state = self.state_store.get(self.alert_state_key(org, repo))
+            if state is None:
+                full.append(repo)
+                continue
+            last_full = datetime.datetime.strptime(state["last_full"], "%Y-%m-%d")
+            if (today - last_full.date()).days >= self.full_sync_days:
+                full.append(repo)
+            else:
+                cursors[repo] = state["cursor"]
+        results = {}
+        for repo, response in self.get_data_for_repos(org, full).items():
+            results[repo] = ("full", response)
+        for repo, response in self.get_data_for_repos(
+            org, list(cursors), cursors
+        ).items():
+            response["delta"] = {"since_cursor": cursors[repo]}
+            results[repo] = ("delta", response)
+        return results
+
+    def alert_state_key(self, org, repo):
+        return f"alerts/{org}/{repo}"
+
+    def save_alert_state(self, org, repo, kind, response):
+        """
+        Move the repo's alert high-water mark to the end of response
+        """
+        if self.state_store is None:
+            return
+        key = self.alert_state_key(org, repo)
+        state = self.state_store.get(key) or {}
+        end_cursor = response["data"]["organization"]["repository"][
+            "vulnerabilityAlerts"
+        ]["pageInfo"]["endCursor"]
+        if kind == "full":
+            state["last_full"] = datetime.date.today().strftime("%Y-%m-%d")
+            state["cursor"] = end_cursor
+        elif end_cursor is not None:
+            # an empty delta page has no cursor, keep the previous one
+            state["cursor"] = end_cursor
+        self.state_store.put(key, state)
+
+    def get_batch_organization(self, query, variables):
+        """
+        Run an aliased batch query
+        Returns: the organization object holding the repo0..repoN aliases
+        """
+        response = self.make_graphql_query(query, variables, self.github_v4_cve_headers)
+        data = response.get("data") or {}
+        if data.get("organization") is None:
+            msg = f"Error when requesting: {query} {variables} and got response: {response.get('errors')}"
+            raise GitHubV4Error(msg)
+        return data["organization"]
+
     def get_org_repo_list(self, org_name):
         """
-        get list of repos in an org
+        get list of repos in an org, see GitHub_Common.RepoInventory for the
+        fields of each repo
         Returns: array of repo data in an org and the id for the v4 API
         """
-        query = self.repo.get_full_org_repos()
-        variables = {"login": org_name, "first": 100}
+        scope = f"v4/repos/{org_name}"
+        repo_data = []
+        repo_page_info = {"endCursor": None, "hasNextPage": True}
+        index = 0
+        if self.checkpoint is not None:
+            # continue after the pages an interrupted run already listed
+            pages, cursor = self.checkpoint.load_pages(scope)
+            for page in pages:
+                repo_data += page
+            index = len(pages)
+            if pages:
+                repo_page_info["endCursor"] = cursor
         try:
-            response = self.make_graphql_query(
-                query, variables, self.github_v4_normal_headers
-            )
-            repo_data = response["data"]["organization"]["repositories"]["edges"]
-            repo_page_info = response["data"]["organization"]["repositories"][
-                "pageInfo"
-            ]
             while repo_page_info["hasNextPage"]:
                 query = self.repo.get_full_org_repos()
                 variables = {
@@ -252,10 +636,18 @@ class GitHub_v4:
                 response = self.make_graphql_query(
                     query, variables, self.github_v4_normal_headers
                 )
-                repo_data += response["data"]["organization"]["repositories"]["edges"]
+                edges = response["data"]["organization"]["repositories"]["edges"]
+                repo_data += edges
                 repo_page_info = response["data"]["organization"]["repositories"][
                     "pageInfo"
                 ]
+                if self.checkpoint is not None and repo_page_info["hasNextPage"]:
+                    self.checkpoint.save_page(
+                        scope, index, edges, repo_page_info["endCursor"]
+                    )
+                index += 1
+            if self.checkpoint is not None:
+                self.checkpoint.clear_pages(scope)
             repo_list = []
             for repo_info in repo_data:
                 repo_list.append(repo_info["node"])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+# full imports
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# imports from my biz
+from github_simulator import GitHubSimulator
+from GitHub_Common import (
+    Collector,
+    DiskSink,
+    RateLimitGovernor,
+    TokenPool,
+    Transport,
+)
+from GitHub_V3 import GitHub_v3
+from GitHub_V4 import GitHub_v4
+
+parser = argparse.ArgumentParser(
+    description="Time datastore.py crawls of synthetic orgs against the GitHub simulator"
+)
+parser.add_argument(
+    "--repos",
+    "-r",
+    type=int,
+    nargs="+",
+    default=[10, 100, 1000],
+    help="Org sizes to crawl, one run each (default: 10 100 1000)",
+)
+parser.add_argument("--workers", "-w", type=int, default=1)
+parser.add_argument("--endpoint-workers", type=int, default=1)
+parser.add_argument("--graphql-batch", type=int, default=1)
+parser.add_argument("--tokens", type=int, default=1, help="Number of tokens to pool")
+parser.add_argument(
+    "--latency", type=float, default=0.0, help="Seconds added to every response"
+)
+parser.add_argument(
+    "--error-rate", type=float, default=0.0, help="Fraction of requests answering 502"
+)
+parser.add_argument(
+    "--stats-pending",
+    type=int,
+    default=0,
+    help="Times each /stats/* endpoint answers 202 before its data is ready",
+)
+parser.add_argument(
+    "--alerts", type=int, default=3, help="Vulnerability alerts per repo"
+)
+parser.add_argument(
+    "--budget",
+    type=int,
+    default=1000000,
+    help="Rate limit points per token and API (default: 1000000, GitHub gives 5000)",
+)
+parser.add_argument(
+    "--reset-after",
+    type=float,
+    default=3600,
+    help="Seconds until the rate limit budget is refilled (default: 3600)",
+)
+parser.add_argument(
+    "--retry-sleep",
+    type=float,
+    default=0.05,
+    help="Seconds the clients wait before retrying a failed request (default: 0.05)",
+)
+parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+
+
+def crawl(args, repos):
+    """
+    Crawl one synthetic org of repos the way datastore.py does, writing the
+    documents to a temporary directory
+    Returns: dict of measurements
+    """
+    simulator = GitHubSimulator(
+        {"bench": repos},
+        latency=args.latency,
+        error_rate=args.error_rate,
+        stats_pending=args.stats_pending,
+        alerts=args.alerts,
+        rest_budget=args.budget,
+        graphql_budget=args.budget,
+        reset_after=args.reset_after,
+    ).start()
+    transport = Transport(pool_size=max(10, args.workers * args.endpoint_workers))
+    token_pool = TokenPool(
+        [f"token{index}" for index in range(args.tokens)],
+        RateLimitGovernor(sleep_time=args.retry_sleep),
+    )
+    with tempfile.TemporaryDirectory() as root:
+        sink = DiskSink(root)
+        ghv4 = GitHub_v4(token_pool, transport, args.graphql_batch, sink=sink)
+        ghv3 = GitHub_v3(token_pool, transport, args.endpoint_workers, sink=sink)
+        ghv4.github_v4_url = simulator.url + "/graphql"
+        ghv3.github_v3_url = simulator.url
+        ghv4.sleep_time = ghv3.sleep_time = args.retry_sleep
+        ghv3.stats_scheduler.base_delay = args.retry_sleep
+        collector = Collector(args.workers)
+
+        start = time.perf_counter()
+        v4_files = ghv4.write_data_for_org_disk("bench", collector)
+        v3_files = ghv3.write_org_traffic("bench", collector=collector)
+        elapsed = time.perf_counter() - start
+    transport.close()
+    simulator.stop()
+    counters = simulator.reset_counters()
+    return {
+        "repos": repos,
+        "wall": round(elapsed, 3),
+        "files": len(v4_files) + len(v3_files),
+        "rest_requests": counters.get("rest_requests", 0),
+        "graphql_requests": counters.get("graphql_requests", 0),
+        "rest_points": counters.get("rest_points", 0),
+        "graphql_points": counters.get("graphql_points", 0),
+        "errors": counters.get("errors", 0),
+        "rate_limited": counters.get("rate_limited", 0),
+    }
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    logging.basicConfig(format="%(levelname)s:%(message)s", level="ERROR")
+    for repos in args.repos:
+        result = crawl(args, repos)
+        if args.json:
+            print(json.dumps(result, sort_keys=True))
+            continue
+        print(
+            f"repos={result['repos']:<6} wall={result['wall']:8.2f}s "
+            f"files={result['files']:<6} "
+            f"requests={result['rest_requests']}+{result['graphql_requests']} "
+            f"points={result['rest_points']}+{result['graphql_points']} "
+            f"errors={result['errors']} rate_limited={result['rate_limited']} "
+            f"repos/s={result['repos'] / max(result['wall'], 1e-6):.1f}"
+        )
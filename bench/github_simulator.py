@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Local stand-in for the parts of api.github.com that GitHub_v3 and GitHub_v4
+use, so crawls can be measured without spending real quota. Point a client
+at it by setting github_v3_url to url and github_v4_url to url + "/graphql".
+"""
+
+# full imports
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+
+# cherry-pick imports
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlparse
+
+parser = argparse.ArgumentParser(description="Serve a simulated GitHub API")
+parser.add_argument("--port", "-p", type=int, default=8000)
+parser.add_argument(
+    "--org",
+    action="append",
+    help="org:repo_count to serve, repeat for several orgs (default: bench:100)",
+)
+parser.add_argument("--latency", type=float, default=0.0)
+parser.add_argument("--error-rate", type=float, default=0.0)
+parser.add_argument("--stats-pending", type=int, default=0)
+parser.add_argument("--alerts", type=int, default=3)
+parser.add_argument("--archived-rate", type=float, default=0.0)
+parser.add_argument("--idle-rate", type=float, default=0.0)
+parser.add_argument("--rest-budget", type=int, default=5000)
+parser.add_argument("--graphql-budget", type=int, default=5000)
+parser.add_argument("--reset-after", type=float, default=3600)
+
+# a page of /orgs/{org}/repos without per_page, like GitHub
+REPOS_PER_PAGE = 30
+
+
+class Budget:
+    def __init__(self, limit, reset_after):
+        """
+        Rate limit budget of one token for one API, refilled every
+        reset_after seconds
+        """
+        self.limit = limit
+        self.reset_after = reset_after
+        self.remaining = limit
+        self.reset = time.time() + reset_after
+        self.lock = threading.Lock()
+
+    def spend(self, cost):
+        """
+        Returns: True if cost points were left and have been spent
+        """
+        with self.lock:
+            if time.time() >= self.reset:
+                self.remaining = self.limit
+                self.reset = time.time() + self.reset_after
+            if self.remaining < cost:
+                return False
+            self.remaining -= cost
+            return True
+
+    def headers(self, resource):
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(int(math.ceil(self.reset))),
+            "X-RateLimit-Used": str(self.limit - self.remaining),
+            "X-RateLimit-Resource": resource,
+        }
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length", "0"))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def token(self):
+        return self.headers.get("Authorization", "anonymous")
+
+    def do_GET(self):
+        simulator = self.server.simulator
+        simulator.count("rest_requests")
+        time.sleep(simulator.latency)
+        url = urlparse(self.path)
+        budget = simulator.budget("core", self.token())
+        if url.path == "/rate_limit":
+            # free, like GitHub
+            return self.send_json(
+                200,
+                {"resources": {"core": {"remaining": budget.remaining}}},
+                budget.headers("core"),
+            )
+        if simulator.inject_error():
+            return self.send_json(502, {"message": "Server Error"})
+        status, body, headers = simulator.rest(url.path, parse_qs(url.query))
+        etag = '"%s"' % hashlib.md5(json.dumps(body).encode()).hexdigest()
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            # conditional requests that hit don't count against the limit
+            simulator.count("not_modified")
+            return self.send_json(304, None, dict(budget.headers("core"), ETag=etag))
+        if not budget.spend(1):
+            simulator.count("rate_limited")
+            return self.send_json(
+                403, {"message": "API rate limit exceeded"}, budget.headers("core")
+            )
+        simulator.count("rest_points")
+        headers = dict(headers, **budget.headers("core"))
+        if status == 200:
+            headers["ETag"] = etag
+        return self.send_json(status, body, headers)
+
+    def do_POST(self):
+        simulator = self.server.simulator
+        simulator.count("graphql_requests")
+        # always read the body, the connection is reused for the next request
+        request = self.read_body()
+        time.sleep(simulator.latency)
+        if urlparse(self.path).path != "/graphql":
+            return self.send_json(404, {"message": "Not Found"})
+        if simulator.inject_error():
+            return self.send_json(502, {"message": "Server Error"})
+        query = request.get("query", "")
+        budget = simulator.budget("graphql", self.token())
+        cost = simulator.graphql_cost(query)
+        if not budget.spend(cost):
+            simulator.count("rate_limited")
+            return self.send_json(
+                200,
+                {"errors": [{"type": "RATE_LIMITED", "message": "rate limited"}]},
+                budget.headers("graphql"),
+            )
+        simulator.count("graphql_points", cost)
+        data = simulator.graphql(query, request.get("variables") or {})
+        if "rateLimit" in query:
+            data["rateLimit"] = {
+                "cost": cost,
+                "remaining": budget.remaining,
+                "resetAt": time.strftime(
+                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime(budget.reset)
+                ),
+            }
+        return self.send_json(200, {"data": data}, budget.headers("graphql"))
+
+
+class SimulatorServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class GitHubSimulator:
+    def __init__(
+        self,
+        orgs,
+        latency=0.0,
+        error_rate=0.0,
+        stats_pending=0,
+        alerts=3,
+        rest_budget=5000,
+        graphql_budget=5000,
+        reset_after=3600,
+        seed=0,
+        archived_rate=0.0,
+        idle_rate=0.0,
+    ):
+        """
+        Simulated GitHub API serving synthetic orgs.
+
+        orgs: dict of org name to number of repos
+        latency: seconds added to every response
+        error_rate: fraction of requests answered with a 502
+        stats_pending: times each /stats/* endpoint of a repo answers 202
+                       before its data is ready
+        alerts: vulnerability alerts per repo
+        rest_budget/graphql_budget: rate limit points per token, refilled
+                                    every reset_after seconds
+        archived_rate: fraction of repos listed as archived
+        idle_rate: fraction of the other repos last pushed to two years ago
+        """
+        self.orgs = orgs
+        self.latency = latency
+        self.error_rate = error_rate
+        self.stats_pending = stats_pending
+        self.alerts = alerts
+        self.rest_budget = rest_budget
+        self.graphql_budget = graphql_budget
+        self.reset_after = reset_after
+        self.archived_rate = archived_rate
+        self.idle_rate = idle_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.budgets = {}
+        self.pending = {}
+        self.counters = {}
+        self.server = None
+
+    def start(self, port=0):
+        self.server = SimulatorServer(("127.0.0.1", port), SimulatorHandler)
+        self.server.simulator = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset_counters(self):
+        """
+        Returns: the counters so far, and starts counting from zero
+        """
+        with self.lock:
+            counters, self.counters = self.counters, {}
+        return counters
+
+    def budget(self, resource, token):
+        with self.lock:
+            key = (resource, token)
+            if key not in self.budgets:
+                limit = self.rest_budget if resource == "core" else self.graphql_budget
+                self.budgets[key] = Budget(limit, self.reset_after)
+            return self.budgets[key]
+
+    def inject_error(self):
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+        if failed:
+            self.count("errors")
+        return failed
+
+    def repo_names(self, org):
+        return [f"repo{index}" for index in range(self.orgs.get(org, 0))]
+
+    def repo_state(self, org, name):
+        """
+        The same for a repo on every request
+        Returns: tuple of (archived, idle), archived repos are also idle
+        """
+        digest = hashlib.sha256(f"{org}/{name}".encode()).digest()
+        archived = digest[0] / 256 < self.archived_rate
+        return archived, archived or digest[1] / 256 < self.idle_rate
+
+    def repo_metadata(self, org, name):
+        """
+        Returns: dict of isArchived, isFork, pushedAt and visibility
+        """
+        archived, idle = self.repo_state(org, name)
+        pushed = time.time()
+        if idle:
+            pushed -= 2 * 365 * 24 * 3600
+        return {
+            "isArchived": archived,
+            "isFork": False,
+            "pushedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(pushed)),
+            "visibility": "PUBLIC",
+        }
+
+    def rest(self, path, query):
+        """
+        Returns: tuple of (status, body, headers) for a REST path
+        """
+        match = re.match(r"^/orgs/([^/]+)/repos$", path)
+        if match:
+            return self.repo_page(match.group(1), query)
+        match = re.match(r"^/repos/([^/]+)/([^/]+)/(.+)$", path)
+        if match is None or match.group(2) not in self.repo_names(match.group(1)):
+            return 404, {"message": "Not Found"}, {}
+        org, repo, endpoint = match.groups()
+        if endpoint.startswith("stats/"):
+            with self.lock:
+                key = (org, repo, endpoint)
+                self.pending.setdefault(key, self.stats_pending)
+                if self.pending[key] > 0:
+                    # still being computed
+                    self.pending[key] -= 1
+                    return 202, None, {}
+        body = self.rest_body(org, repo, endpoint)
+        if (
+            endpoint in ("traffic/views", "traffic/clones")
+            and self.repo_state(org, repo)[1]
+        ):
+            # nobody visits idle repos
+            body = {"count": 0, "uniques": 0, endpoint[8:]: []}
+        if body is None:
+            return 404, {"message": "Not Found"}, {}
+        return 200, body, {}
+
+    def repo_page(self, org, query):
+        if org not in self.orgs:
+            return 404, {"message": "Not Found"}, {}
+        per_page = int(query.get("per_page", [REPOS_PER_PAGE])[0])
+        page = int(query.get("page", ["1"])[0])
+        names = self.repo_names(org)
+        last = max(1, math.ceil(len(names) / per_page))
+        body = []
+        for name in names[(page - 1) * per_page : page * per_page]:
+            metadata = self.repo_metadata(org, name)
+            body.append(
+                {
+                    "name": name,
+                    "full_name": f"{org}/{name}",
+                    "archived": metadata["isArchived"],
+                    "fork": metadata["isFork"],
+                    "pushed_at": metadata["pushedAt"],
+                    "visibility": metadata["visibility"].lower(),
+                }
+            )
+        headers = {}
+        if page < last:
+            base = f"{self.url}/orgs/{org}/repos?per_page={per_page}"
+            headers["Link"] = (
+                f'<{base}&page={page + 1}>; rel="next", <{base}&page={last}>; rel="last"'
+            )
+        return 200, body, headers
+
+    def rest_body(self, org, repo, endpoint):
+        day = "2019-12-01T00:00:00Z"
+        week = 1575158400
+        bodies = {
+            "contents": [
+                {"name": "README.md", "path": "README.md", "type": "file", "size": 10}
+            ],
+            "traffic/popular/referrers": [
+                {"referrer": "github.com", "count": 4, "uniques": 3}
+            ],
+            "traffic/popular/paths": [
+                {"path": f"/{org}/{repo}", "title": repo, "count": 4, "uniques": 3}
+            ],
+            "traffic/views": {
+                "count": 3,
+                "uniques": 2,
+                "views": [{"timestamp": day, "count": 3, "uniques": 2}],
+            },
+            "traffic/clones": {
+                "count": 1,
+                "uniques": 1,
+                "clones": [{"timestamp": day, "count": 1, "uniques": 1}],
+            },
+            "stats/contributors": [
+                {
+                    "author": {"login": "octocat"},
+                    "total": 5,
+                    "weeks": [{"w": week, "a": 10, "d": 2, "c": 5}],
+                }
+            ],
+            "stats/commit_activity": [
+                {"days": [0, 1, 0, 2, 0, 1, 0], "total": 4, "week": week}
+            ],
+            "stats/code_frequency": [[week, 10, -2]],
+            "stats/participation": {"all": [4] * 52, "owner": [1] * 52},
+            "stats/punch_card": [[0, 12, 3]],
+        }
+        return bodies.get(endpoint)
+
+    def graphql_cost(self, query):
+        """
+        GitHub's rule of thumb: one point per 100 connection requests the
+        query could make, at least 1
+        Returns: points the query costs
+        """
+        connections = len(re.findall(r"\(\s*first:", query))
+        return max(1, math.ceil(connections / 100))
+
+    def graphql(self, query, variables):
+        """
+        Returns: data object for the org repo list, repo info and aliased
+        batch queries the v4 client sends
+        """
+        if "repositories(" in query:
+            org = variables.get("login")
+            if org not in self.orgs:
+                return {"organization": None}
+            return {"organization": {"repositories": self.repositories(org, variables)}}
+        org = variables.get("org_name")
+        if org not in self.orgs:
+            return {"organization": None}
+        first = variables.get("first", 100)
+        if "repo0:" not in query:
+            return {
+                "organization": {
+                    "repository": self.repository(
+                        org, variables["repo_name"], first, variables.get("after")
+                    )
+                }
+            }
+        organization = {}
+        index = 0
+        while f"repo{index}" in variables:
+            organization[f"repo{index}"] = self.repository(
+                org, variables[f"repo{index}"], first, variables.get(f"after{index}")
+            )
+            index += 1
+        return {"organization": organization}
+
+    def repositories(self, org, variables):
+        first = variables.get("first", 100)
+        start = int(variables["after"]) if variables.get("after") else 0
+        names = self.repo_names(org)
+        edges = [
+            {
+                "cursor": str(index + 1),
+                "node": dict(
+                    self.repo_metadata(org, name),
+                    id=f"{org}/{name}",
+                    name=name,
+                    nameWithOwner=f"{org}/{name}",
+                ),
+            }
+            for index, name in enumerate(names[start : start + first], start)
+        ]
+        return {
+            "edges": edges,
+            "pageInfo": {
+                "endCursor": edges[-1]["cursor"] if edges else None,
+                "hasNextPage": start + first < len(names),
+            },
+            "totalCount": len(names),
+        }
+
+    def repository(self, org, repo, first, after):
+        if repo not in self.repo_names(org):
+            return None
+        start = int(after) if after else 0
+        edges = [
+            {"cursor": str(index + 1), "node": self.alert(org, repo, index)}
+            for index in range(start, min(start + first, self.alerts))
+        ]
+        count = {"totalCount": 1}
+        return {
+            "name": repo,
+            "nameWithOwner": f"{org}/{repo}",
+            "forks": count,
+            "issues": count,
+            "pullRequests": count,
+            "stargazers": count,
+            "watchers": count,
+            "languages": {"edges": [{"node": {"name": "Python"}}]},
+            "vulnerabilityAlerts": {
+                "edges": edges,
+                "pageInfo": {
+                    "endCursor": edges[-1]["cursor"] if edges else after,
+                    "hasNextPage": start + first < self.alerts,
+                },
+            },
+        }
+
+    def alert(self, org, repo, index):
+        return {
+            "createdAt": "2019-12-01T00:00:00Z",
+            "dismissReason": None,
+            "dismissedAt": None,
+            "dismisser": None,
+            "id": f"{org}/{repo}/{index}",
+            "securityAdvisory": {
+                "identifiers": [{"type": "GHSA", "value": f"GHSA-{index:04d}"}],
+                "ghsaId": f"GHSA-{index:04d}",
+                "references": [],
+            },
+            "securityVulnerability": {
+                "advisory": {
+                    "description": "synthetic",
+                    "id": str(index),
+                    "publishedAt": "2019-11-01T00:00:00Z",
+                    "severity": "MODERATE",
+                    "summary": "synthetic advisory",
+                },
+                "firstPatchedVersion": {"identifier": "1.0.1"},
+                "package": {"ecosystem": "PIP", "name": "example"},
+                "severity": "MODERATE",
+                "updatedAt": "2019-11-01T00:00:00Z",
+                "vulnerableVersionRange": "< 1.0.1",
+            },
+            "vulnerableManifestFilename": "requirements.txt",
+            "vulnerableManifestPath": "requirements.txt",
+            "vulnerableRequirements": "= 1.0.0",
+        }
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    orgs = {}
+    for org in args.org or ["bench:100"]:
+        name, repos = org.split(":")
+        orgs[name] = int(repos)
+    simulator = GitHubSimulator(
+        orgs,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        stats_pending=args.stats_pending,
+        alerts=args.alerts,
+        rest_budget=args.rest_budget,
+        graphql_budget=args.graphql_budget,
+        reset_after=args.reset_after,
+        archived_rate=args.archived_rate,
+        idle_rate=args.idle_rate,
+    ).start(args.port)
+    print(f"Simulated GitHub API at {simulator.url} serving {orgs}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+# full imports
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# imports from my biz
+from GitHub_V3 import GitHub_v3
+from GitHub_V4 import GitHub_v4
+
+parser = argparse.ArgumentParser(
+    description="Compare list concatenation against in-place pagination on synthetic pages"
+)
+parser.add_argument(
+    "--pages", "-p", type=int, nargs="+", default=[100, 500, 1000, 2000]
+)
+parser.add_argument("--page-size", type=int, default=100)
+
+
+class SyntheticResponse:
+    def __init__(self, body, link=None):
+        self.status_code = 200
+        self.headers = {"link": link} if link is not None else {}
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def make_pages(count, size):
+    return [[{"id": page * size + i} for i in range(size)] for page in range(count)]
+
+
+def concat(pages):
+    # the accumulation both paginators used before: copies the list every page
+    body = []
+    for page in pages:
+        body = body + page
+    return body
+
+
+def extend(pages):
+    body = []
+    for page in pages:
+        body.extend(page)
+    return body
+
+
+def synthetic_v3(pages):
+    ghv3 = GitHub_v3("x")
+    link = f'<{ghv3.github_v3_url}/x?page=2>; rel="next", <{ghv3.github_v3_url}/x?page={len(pages)}>; rel="last"'
+    responses = [SyntheticResponse(list(pages[0]), link)]
+    responses += [SyntheticResponse(page) for page in pages[1:]]
+
+    def get(url, headers):
+        # github_pagination_setup rebuilds page urls as ...?&page=N
+        step = int(url.rsplit("page=", 1)[1]) if "page=" in url else 1
+        return responses[step - 1]
+
+    ghv3.governed_get = get
+    return lambda _: ghv3.github_v3_run_query("/x")
+
+
+def synthetic_v4(pages):
+    ghv4 = GitHub_v4("x")
+    responses = []
+    for index, page in enumerate(pages):
+        page_info = {"endCursor": str(index), "hasNextPage": index < len(pages) - 1}
+        alerts = {"edges": list(page), "pageInfo": page_info}
+        responses.append(
+            {"data": {"organization": {"repository": {"vulnerabilityAlerts": alerts}}}}
+        )
+
+    def query(query, variables, headers):
+        after = variables.get("after")
+        return responses[0 if after is None else int(after) + 1]
+
+    ghv4.make_graphql_query = query
+    return lambda _: ghv4.get_data_for_repo("org", "repo")
+
+
+def run(label, accumulate, pages):
+    tracemalloc.start()
+    start = time.perf_counter()
+    accumulate(pages)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"{label:<22} pages={len(pages):<5} wall={elapsed * 1000:9.2f}ms "
+        f"peak={peak / 1024 / 1024:7.2f}MB"
+    )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    for count in args.pages:
+        pages = make_pages(count, args.page_size)
+        run("concatenate", concat, pages)
+        run("extend", extend, pages)
+        run("github_v3_run_query", synthetic_v3(pages), pages)
+        run("get_data_for_repo", synthetic_v4(pages), pages)
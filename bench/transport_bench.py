@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+# full imports
+import argparse
+import json
+import os
+import requests
+import sys
+import threading
+import time
+
+# cherry-pick imports
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# imports from my biz
+from GitHub_Common import Transport
+
+parser = argparse.ArgumentParser(
+    description="Compare bare requests calls against the pooled Transport"
+)
+parser.add_argument("--requests", "-n", type=int, default=500)
+parser.add_argument(
+    "--setup-delay",
+    type=float,
+    default=0.005,
+    help="Seconds the stub waits on each new connection to mimic a TLS handshake",
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        with StubHandler.lock:
+            StubHandler.connections += 1
+        time.sleep(self.server.setup_delay)
+        super().setup()
+
+    def do_GET(self):
+        body = json.dumps({"views": [], "count": 0}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def run(label, get, url, count):
+    StubHandler.connections = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        get(url).json()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{label:<12} requests={count} connections={StubHandler.connections} "
+        f"wall={elapsed:.3f}s per_request={elapsed / count * 1000:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.setup_delay = args.setup_delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/repos/org/repo/traffic/views"
+
+    run("requests.get", requests.get, url, args.requests)
+    transport = Transport()
+    run("Transport", transport.get, url, args.requests)
+    transport.close()
+    server.shutdown()
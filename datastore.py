@@ -18,18 +18,40 @@ import argparse
 import boto3
 import logging
 import os
-import shutil
+import time
 
 # cherry-pick imports
+from boto3.s3.transfer import S3UploadFailedError, TransferConfig
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # imports from my biz
+from GitHub_Common import (
+    Checkpoint,
+    Collector,
+    CrawlScheduler,
+    DiskSink,
+    FileStateStore,
+    Metrics,
+    OutputFormat,
+    ParquetSink,
+    S3Sink,
+    SQLiteConditionalCache,
+    SQLiteStateStore,
+    TokenPool,
+    Transport,
+)
 from GitHub_V3 import GitHub_v3 as ghv3_api
 from GitHub_V4 import GitHub_v4 as ghv4_api
+from GitHub_V4 import GitHubV4Error
 
 parser = argparse.ArgumentParser(description="Triggers gathering data from GitHub")
 parser.add_argument(
-    "--token", "-t", help="GitHub developer token to use instead of one in config"
+    "--token",
+    "-t",
+    action="append",
+    help="GitHub developer token to use instead of the ones in config, repeat or comma separate to use several",
 )
 parser.add_argument(
     "--logging",
@@ -38,24 +60,178 @@ parser.add_argument(
     choices=["DEBUG", "INFO", "WARN", "ERROR", "CRITICAL"],
     default="INFO",
 )
+parser.add_argument(
+    "--workers",
+    "-w",
+    type=int,
+    default=1,
+    help="Number of repos to collect concurrently (default: 1, serial)",
+)
+parser.add_argument(
+    "--endpoint-workers",
+    type=int,
+    help="Number of a repo's traffic/stats endpoints to request at once (default: 1)",
+)
+parser.add_argument(
+    "--graphql-batch",
+    type=int,
+    help="Number of repos fetched per aliased GraphQL query (default: 1)",
+)
+parser.add_argument(
+    "--graphql-fields",
+    help="Comma separated repo fields to fetch besides vulnerability alerts, "
+    "any of counts,languages (default: all)",
+)
+parser.add_argument(
+    "--cache",
+    help="SQLite file for caching REST responses and sending conditional requests",
+)
+parser.add_argument(
+    "--cache-size",
+    type=int,
+    default=256,
+    help="Size in MB the response cache is trimmed to (default: 256)",
+)
+parser.add_argument(
+    "--alert-state",
+    help="JSON file of per-repo alert cursors, turns on incremental alert sync",
+)
+parser.add_argument(
+    "--full-sync-days",
+    type=int,
+    help="Days between full alert snapshots with --alert-state (default: 7)",
+)
+parser.add_argument(
+    "--schedule-state",
+    help="SQLite file of per-repo crawl history, turns on activity based scheduling "
+    "that crawls idle and archived repos less often",
+)
+parser.add_argument(
+    "--checkpoint",
+    default=os.path.join(".cache", "checkpoint.sqlite"),
+    help="SQLite file recording crawl progress (default: .cache/checkpoint.sqlite)",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="Continue an interrupted run from its checkpoint, skipping repos it already wrote",
+)
+parser.add_argument(
+    "--sink",
+    choices=["disk", "s3"],
+    default="disk",
+    help="Stage documents under output/ and upload them at the end (disk), or stream them straight to S3_ROOT_BUCKET as they are collected (s3)",
+)
+parser.add_argument(
+    "--format",
+    choices=["pretty", "compact", "ndjson"],
+    help="Document format: indented JSON (default), compact JSON, or one JSON record per line",
+)
+parser.add_argument(
+    "--compression",
+    choices=["none", "gzip", "zstd"],
+    help="Compress documents, zstd needs the zstandard package (default: none)",
+)
+parser.add_argument(
+    "--parquet",
+    action="store_true",
+    help="Also write traffic and CVE data as Parquet tables, needs the pyarrow package",
+)
+parser.add_argument(
+    "--no-upload",
+    action="store_true",
+    help="Leave documents under output/ instead of uploading them to S3",
+)
+parser.add_argument(
+    "--upload-workers",
+    type=int,
+    default=8,
+    help="Number of concurrent S3 uploads (default: 8)",
+)
+parser.add_argument(
+    "--multipart-threshold",
+    type=int,
+    default=8,
+    help="Size in MB above which staged files are uploaded in parts (default: 8)",
+)
+parser.add_argument(
+    "--metrics",
+    help="JSON file to write request, latency, retry, cost and bytes written metrics to",
+)
+parser.add_argument(
+    "--pool-size",
+    type=int,
+    help="Number of pooled keep-alive connections to api.github.com (default: 10)",
+)
+parser.add_argument(
+    "--timeout",
+    type=float,
+    help="Read timeout in seconds for GitHub API requests (default: 60)",
+)
 
 
-def upload_files_to_s3(s3):
+def upload_files_to_s3(s3_client, workers=8, multipart_threshold=8, attempts=3):
     """
-    Uploads files to S3 while preserving directory structure
+    Uploads files to S3 while preserving directory structure. Files are
+    uploaded by workers threads at once, files over multipart_threshold MB
+    are sent as multipart uploads, and each file is deleted only once its
+    upload succeeded.
+    Returns: array of files that failed to upload and were left on disk
     """
     bucket_name = os.getenv("S3_ROOT_BUCKET")
-    bucket = s3.Bucket(bucket_name)
     upload_path = "output"
+    # botocore retries each part of a multipart upload on its own
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold * 1024 * 1024,
+        multipart_chunksize=multipart_threshold * 1024 * 1024,
+    )
+    paths = []
     for subdir, dirs, files in os.walk(upload_path):
         for file in files:
-            full_path = os.path.join(subdir, file)
-            with open(full_path, "rb") as data:
-                bucket.put_object(Key=full_path[len(upload_path) + 1 :], Body=data)
-            # delete file after upload
-            os.remove(full_path)
-    # delete output folder and remaining directories
-    shutil.rmtree(upload_path)
+            paths.append(os.path.join(subdir, file))
+
+    def upload(full_path):
+        if full_path.endswith(".parquet"):
+            extra_args = {"ContentType": "application/vnd.apache.parquet"}
+        else:
+            extra_args = OutputFormat.from_key(full_path).s3_args()
+        for attempt in range(1, attempts + 1):
+            try:
+                s3_client.upload_file(
+                    full_path,
+                    bucket_name,
+                    full_path[len(upload_path) + 1 :],
+                    ExtraArgs=extra_args,
+                    Config=transfer_config,
+                )
+                break
+            except (BotoCoreError, ClientError, S3UploadFailedError) as e:
+                logging.warn(
+                    f"Upload of {full_path} failed ({attempt}/{attempts}): {e}"
+                )
+        else:
+            return None
+        size = os.path.getsize(full_path)
+        # delete file after upload
+        os.remove(full_path)
+        return size
+
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sizes = list(pool.map(upload, paths))
+    elapsed = max(time.time() - start, 1e-6)
+    failed = [path for path, size in zip(paths, sizes) if size is None]
+    uploaded_bytes = sum(size for size in sizes if size is not None)
+    uploaded = len(paths) - len(failed)
+    logging.info(
+        f"Uploaded {uploaded} files ({uploaded_bytes / 1024 / 1024:.1f}MB) in {elapsed:.1f}s, "
+        f"{uploaded / elapsed:.1f} files/s, {uploaded_bytes / 1024 / 1024 / elapsed:.2f} MB/s"
+    )
+    # delete the directories that are now empty, failed files stay for a rerun
+    for subdir, dirs, files in os.walk(upload_path, topdown=False):
+        if not os.listdir(subdir):
+            os.rmdir(subdir)
+    return failed
 
 
 if __name__ == "__main__":
@@ -65,17 +241,116 @@ if __name__ == "__main__":
     # set logging level
     logging.basicConfig(format="%(levelname)s:%(message)s", level=args.logging)
 
-    token = args.token if args.token is not None else os.getenv("GITHUB_TOKEN")
-    ghv4 = ghv4_api(token)
-    ghv3 = ghv3_api(token)
+    # GITHUB_TOKEN may hold a comma separated list of tokens
+    tokens = ",".join(args.token) if args.token else os.getenv("GITHUB_TOKEN")
+    # share one pooled session between both API clients
+    endpoint_workers = args.endpoint_workers
+    if endpoint_workers is None:
+        endpoint_workers = int(os.getenv("GITHUB_ENDPOINT_WORKERS") or "1")
+    pool_size = args.pool_size
+    if pool_size is None and args.workers * endpoint_workers > 10:
+        # keep a connection per concurrent request
+        pool_size = args.workers * endpoint_workers
+    transport = Transport(pool_size=pool_size, read_timeout=args.timeout)
+    # one token pool and rate limit governor for every worker and both APIs
+    token_pool = TokenPool(tokens)
+    output_format = OutputFormat(args.format, args.compression)
+    # shared by both clients and the sink
+    metrics = Metrics()
+    if args.sink == "s3":
+        sink = S3Sink(
+            os.getenv("S3_ROOT_BUCKET"),
+            args.upload_workers,
+            output_format=output_format,
+            metrics=metrics,
+        )
+    else:
+        sink = DiskSink(output_format=output_format, metrics=metrics)
+    if args.parquet:
+        sink = ParquetSink(sink)
+    if not args.resume and os.path.exists(args.checkpoint):
+        # a fresh run, forget the progress of the last one
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(SQLiteStateStore(args.checkpoint))
+    alert_state = None
+    if args.alert_state is not None:
+        alert_state = FileStateStore(args.alert_state)
+    scheduler = None
+    if args.schedule_state is not None:
+        scheduler = CrawlScheduler(
+            SQLiteStateStore(args.schedule_state), metrics=metrics
+        )
+    ghv4 = ghv4_api(
+        token_pool,
+        transport,
+        args.graphql_batch,
+        state_store=alert_state,
+        full_sync_days=args.full_sync_days,
+        sink=sink,
+        checkpoint=checkpoint,
+        metrics=metrics,
+        field_groups=args.graphql_fields.split(",") if args.graphql_fields else None,
+        scheduler=scheduler,
+    )
+    cache = None
+    if args.cache is not None:
+        cache = SQLiteConditionalCache(args.cache, args.cache_size * 1024 * 1024)
+    ghv3 = ghv3_api(
+        token_pool,
+        transport,
+        endpoint_workers,
+        cache=cache,
+        sink=sink,
+        checkpoint=checkpoint,
+        metrics=metrics,
+        # each org is listed once, over GraphQL, for both clients
+        inventory=ghv4.inventory,
+        scheduler=scheduler,
+    )
+    collector = Collector(args.workers)
 
+    completed = True
     for org_name in os.getenv("GITHUB_ORGS").split(","):
         try:
-            ghv4.write_data_for_org_disk(org_name)
+            ghv4.write_data_for_org_disk(org_name, collector)
+        except GitHubV4Error as e:
+            logging.error(e)
+            completed = False
+        try:
+            ghv3.write_org_traffic(org_name, collector=collector)
         except GitHubV4Error as e:
+            # the repo list comes from the shared GraphQL inventory
             logging.error(e)
-        ghv3.write_org_traffic(org_name)
+            completed = False
 
-    # now upload the json to S3
-    s3 = boto3.resource("s3")
-    upload_files_to_s3(s3)
+    # repos that failed are left for --resume, keep the checkpoint for them
+    for name in ghv4.failed + ghv3.failed:
+        logging.error(f"{name} was not collected")
+        completed = False
+    # wait for any uploads still in flight
+    for key in sink.close():
+        logging.error(f"{key} was not uploaded to S3")
+        completed = False
+    if args.sink == "disk" and not args.no_upload:
+        # now upload the json to S3
+        s3_client = boto3.client("s3")
+        failed = upload_files_to_s3(
+            s3_client, args.upload_workers, args.multipart_threshold
+        )
+        for path in failed:
+            logging.error(f"{path} was not uploaded to S3 and was left on disk")
+            completed = False
+    logging.info(f"Crawl metrics:\n{metrics.table()}")
+    for name, cost in ghv4.planner.report().items():
+        logging.info(
+            f"GraphQL {name}: {cost['queries']} queries, estimated "
+            f"{cost['estimated']} points, charged {cost['actual']}"
+        )
+    if args.metrics is not None:
+        metrics.write_json(args.metrics)
+    if completed:
+        # every org was crawled, the next run starts from scratch
+        checkpoint.store.close()
+        os.remove(args.checkpoint)
+    else:
+        logging.warn("Run incomplete, rerun with --resume to continue it")
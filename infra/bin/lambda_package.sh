@@ -22,4 +22,4 @@ zip -r9 $DIR/package.zip *
 cd $DIR
 zip -g package.zip github-data-pull.py 
 cd ../
-zip -gr lambda/package.zip GitHub_V3 GitHub_V4
+zip -gr lambda/package.zip GitHub_Common GitHub_V3 GitHub_V4
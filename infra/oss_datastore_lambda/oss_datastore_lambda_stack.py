@@ -3,7 +3,6 @@ from aws_cdk import (
     aws_events_targets as targets,
     aws_iam as iam,
     aws_lambda as _lambda,
-    aws_lambda_event_sources as lambda_events,
     aws_s3 as s3,
     aws_sqs as sqs,
     aws_ssm as ssm,
@@ -20,6 +19,16 @@ class OssDatastoreLambdaStack(core.Stack):
         load_dotenv(override=True)
 
         org_list = getenv("GITHUB_ORGS").split(",")
+        # each token in the OSS-Datastore-GitHub-Token secret adds budget for
+        # two more concurrent data pulls
+        token_count = int(getenv("GITHUB_TOKEN_COUNT") or 1)
+        if token_count < 1:
+            raise ValueError(
+                f"GITHUB_TOKEN_COUNT must be at least 1, got {token_count}"
+            )
+
+        # "on" to only crawl the repos and kinds of data that are due
+        crawl_schedule = getenv("GITHUB_CRAWL_SCHEDULE") or "off"
 
         # S3 bucket
         bucket_name = getenv("S3_ROOT_BUCKET")
@@ -29,6 +38,12 @@ class OssDatastoreLambdaStack(core.Stack):
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
             bucket_name=bucket_name,
             encryption=s3.BucketEncryption.S3_MANAGED,
+            # bounds the size of the GitHub conditional request cache
+            lifecycle_rules=[
+                s3.LifecycleRule(
+                    expiration=core.Duration.days(30), prefix="http-cache/"
+                )
+            ],
             versioned=False,
         )
 
@@ -72,23 +87,44 @@ class OssDatastoreLambdaStack(core.Stack):
             "GitHubRepoAggregate",
             runtime=_lambda.Runtime.PYTHON_3_6,
             code=_lambda.Code.from_asset("lambda/package.zip"),
+            environment={
+                "GITHUB_CRAWL_SCHEDULE": crawl_schedule,
+                "GITHUB_STATE_BUCKET": bucket_name,
+                "GITHUB_QUEUE_URL": sqs_queue.queue_url,
+            },
             handler="github-data-pull.github_repo_handler",
             role=lambda_role,
             timeout=core.Duration.minutes(15),
         )
 
-        # TODO: rate limit this as I am running out of tokens
         oss_datastore_pull_lambda = _lambda.Function(
             self,
             "GitHubDataHandler",
             runtime=_lambda.Runtime.PYTHON_3_6,
             code=_lambda.Code.from_asset("lambda/package.zip"),
-            events=[lambda_events.SqsEventSource(sqs_queue)],
+            environment={
+                "GITHUB_CACHE_BUCKET": bucket_name,
+                "GITHUB_CRAWL_SCHEDULE": crawl_schedule,
+                "GITHUB_STATE_BUCKET": bucket_name,
+                "GITHUB_QUEUE_URL": sqs_queue.queue_url,
+            },
             handler="github-data-pull.github_data_handler",
-            reserved_concurrent_executions=2,  # To slow down the token drain
+            # To slow down the token drain
+            reserved_concurrent_executions=2 * token_count,
             role=lambda_role,
             timeout=core.Duration.minutes(15),
         )
+        queue_mapping = _lambda.EventSourceMapping(
+            self,
+            "GitHubDataHandlerQueue",
+            target=oss_datastore_pull_lambda,
+            event_source_arn=sqs_queue.queue_arn,
+            batch_size=10,
+        )
+        # only redeliver the messages the handler reports in batchItemFailures
+        queue_mapping.node.find_child("Resource").add_property_override(
+            "FunctionResponseTypes", ["ReportBatchItemFailures"]
+        )
 
         # lambda scheduler
         lambda_rule = events.Rule(
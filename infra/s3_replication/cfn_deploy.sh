@@ -25,5 +25,8 @@ cp $LOCAL_PATH/roleDefinitionDestinationExample.json roleDefinitionDestinationEx
 sed -i '' "s/S3_REPLICATE_BUCKET_NAME/$S3_REPLICATE_BUCKET_NAME/g" roleDefinitionDestinationExample.json.tmp
 sed -i '' "s/S3_ROOT_BUCKET/$S3_ROOT_BUCKET/g" roleDefinitionDestinationExample.json.tmp
 
+#Upload index.py to the source bucket and point the template at it
+aws cloudformation package --template-file $LOCAL_PATH/pushS3Template.yml --s3-bucket $S3_ROOT_BUCKET --s3-prefix s3-replication --output-template-file pushS3Template.yml.tmp
+
 #Now, let's create the CFN stack to point to the new bucket name
-aws cloudformation create-stack --stack-name replicate-to-$S3_REPLICATE_BUCKET_NAME --capabilities CAPABILITY_AUTO_EXPAND CAPABILITY_IAM CAPABILITY_NAMED_IAM --template-body file://$LOCAL_PATH/pushS3Template.yml --parameters ParameterKey=S3DestinationBucket,ParameterValue=$S3_REPLICATE_BUCKET_NAME,ParameterKey=S3SourceBucket,ParameterValue=$S3_ROOT_BUCKET,ParameterKey=IAMRoleToAssume,ParameterValue=$S3_REPLICATE_OTHER_ROLE_ARN,ParameterKey=ListOfGithubOrgs,ParameterValue=$S3_REPLICATE_OTHER_ROLE_ARN,ParameterKey=LambdaRoleName,ParameterValue=$roleName
+aws cloudformation create-stack --stack-name replicate-to-$S3_REPLICATE_BUCKET_NAME --capabilities CAPABILITY_AUTO_EXPAND CAPABILITY_IAM CAPABILITY_NAMED_IAM --template-body file://pushS3Template.yml.tmp --parameters ParameterKey=S3DestinationBucket,ParameterValue=$S3_REPLICATE_BUCKET_NAME,ParameterKey=S3SourceBucket,ParameterValue=$S3_ROOT_BUCKET,ParameterKey=IAMRoleToAssume,ParameterValue=$S3_REPLICATE_OTHER_ROLE_ARN,ParameterKey=ListOfGithubOrgs,ParameterValue=$S3_REPLICATE_OTHER_ROLE_ARN,ParameterKey=LambdaRoleName,ParameterValue=$roleName
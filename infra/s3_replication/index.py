@@ -1,19 +1,220 @@
 import boto3
 import os
 import datetime
+import gzip
+import json
 import logging
-from botocore.exceptions import ClientError
+import time
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
 
 BACKFILL_EVENT_KEY = 'backfill'
+START_DATE_EVENT_KEY = 'startDate'
+END_DATE_EVENT_KEY = 'endDate'
 CONTENTS_KEY = 'Contents'
+DATE_FORMAT = '%Y-%m-%d'
+# {date}/{prefix}/{org}-{name}-traffic-{timestamp}.json
+KEY_STRUCTURE_PREFIX = '{date}/{prefix}/{parentRepo}'
+# {date}/{prefix}/{table}/{table}-{timestamp}-{part}.parquet from datastore.py --parquet
+TABLE_STRUCTURE_PREFIX = '{date}/{table}/'
+DEFAULT_TABLES = 'traffic/files,traffic/referrers,traffic/paths,traffic/views,traffic/clones,traffic/contributors,traffic/commit_activity,traffic/code_frequency,traffic/participation,traffic/punch_card,cve/counts,cve/languages,cve/vulnerability_alerts'
+# one manifest per date partition and a summary per run, in the destination
+MANIFEST_KEY = '_replication/manifests/{date}.tsv.gz'
+SUMMARY_KEY = '_replication/runs/{timestamp}.json'
+# copy_object only copies objects up to 5GB in a single request
+MAX_COPY_OBJECT_SIZE = 5 * 1024 * 1024 * 1024
+
+
+def date_range(startDate, endDate):
+    """
+    Returns: every date from startDate to endDate (inclusive) as YYYY-MM-DD
+    """
+    start = datetime.datetime.strptime(startDate, DATE_FORMAT)
+    end = datetime.datetime.strptime(endDate, DATE_FORMAT)
+    if end < start:
+        raise ValueError(f'endDate {endDate} is before startDate {startDate}')
+    return [
+        (start + datetime.timedelta(days=day)).strftime(DATE_FORMAT)
+        for day in range((end - start).days + 1)
+    ]
+
+
+def dates_for_event(event, today):
+    """
+    Backfill either a range ({"startDate": ..., "endDate": ...}, endDate
+    defaults to today) or an explicit list ({"backfill": [...]}), otherwise
+    just today
+    Returns: array of dates to replicate
+    """
+    if START_DATE_EVENT_KEY in event.keys():
+        return date_range(
+            event[START_DATE_EVENT_KEY], event.get(END_DATE_EVENT_KEY, today)
+        )
+    if BACKFILL_EVENT_KEY in event.keys():
+        return event[BACKFILL_EVENT_KEY]
+    return [today]
+
+
+def list_objects(s3Client, bucket, prefix):
+    """
+    List every object under prefix, following continuation tokens
+    Returns: dict of key -> (size, ETag)
+    """
+    objects = {}
+    paginator = s3Client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for record in page.get(CONTENTS_KEY, []):
+            objects[record['Key']] = (record['Size'], record['ETag'])
+    return objects
+
+
+def copy_object(s3Client, sourceS3Bucket, destinationS3Bucket, key, size):
+    copySource = {'Bucket': sourceS3Bucket, 'Key': key}
+    if size > MAX_COPY_OBJECT_SIZE:
+        # managed copy, done in parts
+        s3Client.copy(copySource, destinationS3Bucket, key)
+    else:
+        # a single request server side, the ETag and metadata are kept
+        s3Client.copy_object(
+            CopySource=copySource, Bucket=destinationS3Bucket, Key=key
+        )
+
+
+def load_manifest(s3Client, bucket, date):
+    """
+    Read the manifest of the objects replicated for date
+    Returns: dict of key -> (size, ETag) or None if there is no manifest yet
+    """
+    try:
+        response = s3Client.get_object(Bucket=bucket, Key=MANIFEST_KEY.format(date=date))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+    manifest = {}
+    body = gzip.decompress(response['Body'].read()).decode('utf-8')
+    for line in body.splitlines():
+        key, size, etag = line.split('\t')
+        manifest[key] = (int(size), etag)
+    return manifest
+
+
+def save_manifest(s3Client, bucket, date, manifest):
+    """
+    Write the manifest for date as gzipped key<TAB>size<TAB>ETag lines sorted by key
+    """
+    body = ''.join(
+        f'{key}\t{size}\t{etag}\n' for key, (size, etag) in sorted(manifest.items())
+    )
+    s3Client.put_object(
+        Bucket=bucket,
+        Key=MANIFEST_KEY.format(date=date),
+        Body=gzip.compress(body.encode('utf-8')),
+        ContentType='text/tab-separated-values',
+        ContentEncoding='gzip',
+    )
+
+
+def replicate_date(
+    s3Client, sourceS3Bucket, destinationS3Bucket, date, prefixes, pool, optionalPrefixes=()
+):
+    """
+    Copy the objects under prefixes that changed since the last run, going by
+    the date's manifest in the destination bucket instead of listing the
+    destination. Without a manifest the destination is listed once to build it.
+    optionalPrefixes may be empty without a warning, like the Parquet tables
+    of runs without --parquet.
+    Returns: summary dict of objects copied, bytes copied, objects skipped and
+             failed keys
+    """
+
+    def list_prefix(bucket):
+        return lambda prefix: list_objects(s3Client, bucket, prefix)
+
+    def copy(item):
+        key, (size, etag) = item
+        try:
+            copy_object(s3Client, sourceS3Bucket, destinationS3Bucket, key, size)
+        except (BotoCoreError, ClientError) as e:
+            logging.error(f'Failed to copy {key}: {e}')
+            return False
+        return True
+
+    started = time.time()
+    manifest = load_manifest(s3Client, destinationS3Bucket, date)
+    bootstrap = manifest is None
+    if bootstrap:
+        manifest = {}
+        for objects in pool.map(list_prefix(destinationS3Bucket), prefixes):
+            manifest.update(objects)
+    source = {}
+    for prefix, objects in zip(prefixes, pool.map(list_prefix(sourceS3Bucket), prefixes)):
+        if not objects and prefix not in optionalPrefixes:
+            logging.warn(f'Failed to find contents under {prefix}')
+        source.update(objects)
+    toCopy = [(key, info) for key, info in source.items() if manifest.get(key) != info]
+
+    summary = {
+        'copied': 0,
+        'bytes': 0,
+        'skipped': len(source) - len(toCopy),
+        'failed': [],
+    }
+    for (key, info), copied in zip(toCopy, pool.map(copy, toCopy)):
+        if copied:
+            # the source's size and ETag, so the next run compares like with like
+            manifest[key] = info
+            summary['copied'] += 1
+            summary['bytes'] += info[0]
+        else:
+            summary['failed'].append(key)
+    if bootstrap or summary['copied']:
+        save_manifest(s3Client, destinationS3Bucket, date, manifest)
+    summary['seconds'] = round(time.time() - started, 3)
+    return summary
+
+
+def print_metrics(summary):
+    """
+    Print the run's summary as CloudWatch Embedded Metric Format, CloudWatch
+    Logs turns it into metrics
+    """
+    seconds = [dateSummary['seconds'] for dateSummary in summary['dates'].values()]
+    metrics = {
+        'ObjectsCopied': (summary['copied'], 'Count'),
+        'BytesCopied': (summary['bytes'], 'Bytes'),
+        'ObjectsSkipped': (summary['skipped'], 'Count'),
+        'ObjectsFailed': (summary['failed'], 'Count'),
+        # at most 100 values per metric
+        'DateSeconds': (seconds[:100], 'Seconds'),
+    }
+    document = {name: value for name, (value, unit) in metrics.items()}
+    document['_aws'] = {
+        'Timestamp': int(time.time() * 1000),
+        'CloudWatchMetrics': [
+            {
+                'Namespace': os.environ.get('MetricsNamespace', 'OSSDatastoreReplication'),
+                'Dimensions': [[]],
+                'Metrics': [
+                    {'Name': name, 'Unit': unit} for name, (value, unit) in metrics.items()
+                ],
+            }
+        ],
+    }
+    print(json.dumps(document))
+
 
 def replicate(event, context):
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    dates = [today]
-    if BACKFILL_EVENT_KEY in event.keys() :
-        dates = event[BACKFILL_EVENT_KEY]
+    today = datetime.datetime.now().strftime(DATE_FORMAT)
+    dates = dates_for_event(event, today)
 
     ORGS = os.environ['GithubOrgs'].split(',')
+    PREFIXES = os.environ.get('ReplicatePrefixes', 'traffic,repo,cve,repo-delta,cve-delta').split(',')
+    TABLES = [
+        table for table in os.environ.get('ReplicateTables', DEFAULT_TABLES).split(',') if table
+    ]
+    WORKERS = int(os.environ.get('ReplicateWorkers', '16'))
     logger = logging.getLogger()
     logger.setLevel(logging.INFO) #Todo bump up to warn
 
@@ -26,7 +227,7 @@ def replicate(event, context):
         stsAssumedCredentials = sts.assume_role(
             RoleArn=IAM_ROLE_ASSUME,
             RoleSessionName='assumeForS3Copy'
-        )['Credentials'] 
+        )['Credentials']
 
         accessId = stsAssumedCredentials['AccessKeyId']
         secretId = stsAssumedCredentials['SecretAccessKey']
@@ -38,29 +239,55 @@ def replicate(event, context):
             aws_access_key_id=accessId,
             aws_secret_access_key=secretId,
             aws_session_token=sessionToken,
+            # a connection per worker
+            config=Config(max_pool_connections=WORKERS),
         )
 
-        KEY_STRUCTURE_PREFIX = '{date}/traffic/{parentRepo}'#-{name}-traffic-{timestamp}.json
-
-        for date in dates:
-            for repo in ORGS :
-                allObjectsWithPrefix = s3Client.list_objects_v2(
-                    Bucket=sourceS3Bucket,
-                    Prefix=KEY_STRUCTURE_PREFIX.format(date=date, parentRepo=repo)
+        summary = {'dates': {}, 'copied': 0, 'bytes': 0, 'skipped': 0, 'failed': 0}
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            for date in dates:
+                prefixes = [
+                    KEY_STRUCTURE_PREFIX.format(date=date, prefix=prefix, parentRepo=repo)
+                    for prefix in PREFIXES
+                    for repo in ORGS
+                ]
+                tablePrefixes = [
+                    TABLE_STRUCTURE_PREFIX.format(date=date, table=table) for table in TABLES
+                ]
+                dateSummary = replicate_date(
+                    s3Client,
+                    sourceS3Bucket,
+                    destinationS3Bucket,
+                    date,
+                    prefixes + tablePrefixes,
+                    pool,
+                    optionalPrefixes=set(tablePrefixes),
                 )
-                # jsonObjectsWithPrefix = json.loads(allObjectsWithPrefix)
-                if CONTENTS_KEY in allObjectsWithPrefix.keys():
-                    for record in allObjectsWithPrefix[CONTENTS_KEY]:
-                        key = record['Key']
-                        # For each record, copy
-                        copySource = {
-                            'Bucket':sourceS3Bucket,
-                            'Key': key
-                        }
-                        s3Client.copy(copySource, destinationS3Bucket, key)
-                else:
-                    logging.warn(f'Failed to find contents for repo {repo} on {date}')
-    except ClientError as e: 
+                summary['dates'][date] = dateSummary
+                for name in ('copied', 'bytes', 'skipped'):
+                    summary[name] += dateSummary[name]
+                summary['failed'] += len(dateSummary['failed'])
+        print_metrics(summary)
+        logging.info(
+            f"Copied {summary['copied']} objects ({summary['bytes']} bytes), skipped "
+            f"{summary['skipped']} and failed {summary['failed']} for {len(dates)} dates"
+        )
+        s3Client.put_object(
+            Bucket=destinationS3Bucket,
+            Key=SUMMARY_KEY.format(
+                timestamp=datetime.datetime.now().strftime('%Y-%m-%dT%H-%M-%S')
+            ),
+            Body=json.dumps(summary, sort_keys=True, indent=2).encode('utf-8'),
+            ContentType='application/json',
+        )
+        if summary['failed']:
+            logging.error(f"Failed to copy {summary['failed']} objects on {today}")
+            return {
+                'statusCode': 500,
+                'headers': {"Content-Type": "text/plain"},
+                'body': f"failed to copy {summary['failed']} objects on {today}",
+            }
+    except ClientError as e:
         logging.critical(e)
         logging.error(f'Failed to copy on {today}');
         return {
@@ -71,5 +298,6 @@ def replicate(event, context):
     return {
         'statusCode': 200,
         'headers': {"Content-Type": "text/plain"},
-        'body': f'Succeeded on {today}',
+        'body': f"Succeeded on {today}, copied {summary['copied']} objects "
+        f"({summary['bytes']} bytes) and skipped {summary['skipped']}",
     }
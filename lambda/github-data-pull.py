@@ -1,58 +1,327 @@
 import boto3
 import datetime
+import hashlib
 import json
+import os
+import threading
+import time
 
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from GitHub_Common import (
+    Checkpoint,
+    CrawlScheduler,
+    Metrics,
+    S3ConditionalCache,
+    S3StateStore,
+    TokenPool,
+    Transport,
+)
 from GitHub_V3 import GitHub_v3 as ghv3_api
 from GitHub_V3 import GitHubV3Error
 from GitHub_V4 import GitHub_v4 as ghv4_api
 from GitHub_V4 import GitHubV4Error
 
+# everything below is built once per container and reused by warm invocations
+container_started = time.time()
+warm = False
+container_cache = {}  # name -> (value, created)
+container_cache_lock = threading.Lock()
+# seconds the token and org list are trusted before being read again
+config_ttl = int(os.getenv("GITHUB_CONFIG_TTL") or "900")
 
-def get_sqs_url(sqs_client):
+
+def cached(name, build, ttl=None):
     """
-    Get the datastores SQS URL.
+    Returns: build() result kept for the life of the container, or for ttl
+             seconds if given
     """
-    sqs_map = sqs_client.list_queues()
-    sqs_url = ""
-    for url in sqs_map["QueueUrls"]:
-        split = url.split("/")
-        if split[-1] == "GitHubDatastoreQueue":
-            sqs_url = url
-    return sqs_url
+    with container_cache_lock:
+        entry = container_cache.get(name)
+        if entry is not None and (ttl is None or time.time() - entry[1] < ttl):
+            return entry[0]
+    value = build()
+    with container_cache_lock:
+        container_cache[name] = (value, time.time())
+    return value
 
 
-def github_repo_handler(event, context):
+def aws_client(service):
+    return cached(
+        f"client:{service}",
+        lambda: boto3.client(service_name=service, region_name="us-west-2"),
+    )
+
+
+def get_secret():
     """
-    Once a day grab all the repos from our orgs and add their names to an SQS queue
+    Get the GitHub token(s) from secrets manager
+    """
+
+    def fetch():
+        secret_data = aws_client("secretsmanager").get_secret_value(
+            SecretId="OSS-Datastore-GitHub-Token"
+        )
+        secret_token = json.loads(secret_data["SecretString"])
+        return secret_token["OSS-Datastore-GitHub-Token"]
+
+    return cached("secret", fetch, config_ttl)
+
+
+def get_org_list():
+    """
+    Get the orgs to crawl from systems manager
+    """
+    return cached(
+        "org_list",
+        lambda: aws_client("ssm").get_parameter(
+            Name="GitHubDatastoreOrgList", WithDecryption=True
+        )["Parameter"]["Value"],
+        config_ttl,
+    )
+
+
+def get_clients():
+    """
+    GitHub clients sharing one pooled session, token pool, S3 client and repo
+    inventory. They are rebuilt only when the secret changes, so warm
+    invocations keep the open connections, the rate limit budget seen so far
+    and org repo lists younger than GITHUB_INVENTORY_TTL.
+    Returns: tuple of (GitHub_v3, GitHub_v4)
+    """
+    secret = get_secret()
+
+    def build():
+        transport = Transport()
+        # the secret may hold a comma separated token list
+        token_pool = TokenPool(secret)
+        s3_client = aws_client("s3")
+        # conditional requests that come back 304 don't use any rate limit
+        http_cache = None
+        if os.getenv("GITHUB_CACHE_BUCKET"):
+            http_cache = S3ConditionalCache(
+                os.getenv("GITHUB_CACHE_BUCKET"), s3_client=s3_client
+            )
+        # incremental alert sync is opt-in, it writes cve-delta documents on
+        # the days between full snapshots
+        alert_state = None
+        if os.getenv("GITHUB_INCREMENTAL_ALERTS", "off") == "on":
+            alert_state = get_state_store()
+        ghv4 = ghv4_api(
+            token_pool,
+            transport,
+            state_store=alert_state,
+            s3_client=s3_client,
+            metrics=get_metrics(),
+            scheduler=get_scheduler(),
+        )
+        ghv3 = ghv3_api(
+            token_pool,
+            transport,
+            cache=http_cache,
+            s3_client=s3_client,
+            metrics=get_metrics(),
+            inventory=ghv4.inventory,
+            scheduler=get_scheduler(),
+        )
+        return ghv3, ghv4
+
+    return cached("clients:" + hashlib.sha256(secret.encode()).hexdigest(), build)
+
+
+def get_metrics():
+    return cached("metrics", Metrics)
+
+
+def flush_metrics():
+    """
+    Print the metrics collected during this invocation as CloudWatch Embedded
+    Metric Format, CloudWatch Logs turns them into metrics
+    """
+    metrics = get_metrics()
+    namespace = os.getenv("GITHUB_METRICS_NAMESPACE") or "OSSDatastore"
+    for document in metrics.emf(namespace):
+        print(document)
+    metrics.reset()
+
+
+def get_state_store():
+    if not os.getenv("GITHUB_STATE_BUCKET"):
+        return None
+    return cached(
+        "state_store",
+        lambda: S3StateStore(
+            os.getenv("GITHUB_STATE_BUCKET"), s3_client=aws_client("s3")
+        ),
+    )
+
+
+def get_scheduler():
     """
-    # secrets manager setup for GitHub token
-    secrets_client = boto3.client(
-        service_name="secretsmanager", region_name="us-west-2"
+    Returns: CrawlScheduler keeping its state in the state bucket when
+             GITHUB_CRAWL_SCHEDULE is on, otherwise None and every repo is
+             crawled in full every day
+    """
+    if os.getenv("GITHUB_CRAWL_SCHEDULE", "off") != "on" or get_state_store() is None:
+        return None
+    return cached(
+        "scheduler", lambda: CrawlScheduler(get_state_store(), metrics=get_metrics())
+    )
+
+
+def get_sqs_url(sqs_client):
+    """
+    Get the datastores SQS URL, from GITHUB_QUEUE_URL when the stack set it
+    """
+    if os.getenv("GITHUB_QUEUE_URL"):
+        return os.getenv("GITHUB_QUEUE_URL")
+    return cached(
+        "sqs_url",
+        lambda: sqs_client.get_queue_url(QueueName="GitHubDatastoreQueue")["QueueUrl"],
     )
-    secret_data = secrets_client.get_secret_value(SecretId="OSS-Datastore-GitHub-Token")
-    secret_token = json.loads(secret_data["SecretString"])
-    secret = secret_token["OSS-Datastore-GitHub-Token"]
 
-    # systems manager setup
-    config_client = boto3.client(service_name="ssm", region_name="us-west-2")
 
-    # GitHub client setup
-    ghv3 = ghv3_api(secret)
-    org_list = config_client.get_parameter(
-        Name="GitHubDatastoreOrgList", WithDecryption=True
-    )["Parameter"]["Value"]
+class Deadline:
+    def __init__(self, context, margin=None):
+        """
+        Tells handlers when to stop pulling more work so they can finish what
+        they started before the Lambda times out.
+        margin: seconds to keep in reserve, GITHUB_DEADLINE_MARGIN if None
+        """
+        if margin is None:
+            margin = int(os.getenv("GITHUB_DEADLINE_MARGIN") or "120")
+        self.context = context
+        self.margin = margin
+
+    def expired(self):
+        return self.context.get_remaining_time_in_millis() < self.margin * 1000
+
+
+def log_start(name, started):
+    """
+    Print whether this was a cold or warm start and how long setup took
+    """
+    global warm
+    kind = "warm" if warm else "cold"
+    since = time.time() - (started if warm else container_started)
+    print(f"{name} {kind} start, ready after {since:.3f}s")
+    warm = True
+
+
+def repos_in_message(body):
+    """
+    Messages hold a JSON array of org/repo names, or of {"repo": org/repo,
+    "kinds": [...]} when only some kinds of data are due, older ones a
+    single name
+    Returns: array of (org/repo name, kinds) tuples, kinds is None for a
+             full crawl
+    """
+    if not body.startswith("["):
+        return [(body, None)]
+    return [
+        (entry["repo"], entry["kinds"]) if isinstance(entry, dict) else (entry, None)
+        for entry in json.loads(body)
+    ]
+
+
+def send_messages(sqs_client, sqs_url, bodies, workers=8, attempts=3):
+    """
+    Send bodies to the queue in batches of 10 (the SQS maximum), several
+    batches at once. Entries SQS reports as failed are retried unless the
+    failure was the sender's fault, and a batch whose request failed
+    (throttling, network errors) is retried whole after a backoff.
+    Returns: array of bodies that could not be sent
+    """
+    batches = [bodies[start : start + 10] for start in range(0, len(bodies), 10)]
+
+    def send(batch):
+        unsent = []
+        for attempt in range(attempts):
+            entries = [
+                {"Id": str(index), "MessageBody": body}
+                for index, body in enumerate(batch)
+            ]
+            try:
+                response = sqs_client.send_message_batch(
+                    QueueUrl=sqs_url, Entries=entries
+                )
+            except (BotoCoreError, ClientError) as e:
+                print(f"Failed to queue a batch of {len(batch)} messages: {e}")
+                time.sleep(2 ** attempt)
+                continue
+            failed = response.get("Failed", [])
+            if not failed:
+                return unsent
+            for failure in failed:
+                print(f"Failed to queue {batch[int(failure['Id'])]}: {failure}")
+            retry = [f for f in failed if not f.get("SenderFault")]
+            unsent += [batch[int(f["Id"])] for f in failed if f.get("SenderFault")]
+            if not retry:
+                return unsent
+            batch = [batch[int(f["Id"])] for f in retry]
+        return unsent + batch
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [body for unsent in pool.map(send, batches) for body in unsent]
 
-    # sqs setup
-    sqs_client = boto3.client(service_name="sqs", region_name="us-west-2")
+
+def github_repo_handler(event, context):
+    """
+    Once a day grab all the repos from our orgs and add their names to an SQS queue
+    """
+    started = time.time()
+    _, ghv4 = get_clients()
+    org_list = get_org_list()
+    sqs_client = aws_client("sqs")
     sqs_url = get_sqs_url(sqs_client)
+    log_start("TriggerGitHubDataPull", started)
+    deadline = Deadline(context)
     date = datetime.datetime.now()
     print(f"TriggerGitHubDataPull {date}")
+    # orgs queued by an earlier invocation today that ran out of time
+    checkpoint = None
+    if get_state_store() is not None:
+        checkpoint = Checkpoint(
+            get_state_store(), prefix=f"checkpoint/{date.strftime('%Y-%m-%d')}/"
+        )
+    # each message carries a chunk of repos
+    chunk_size = int(os.getenv("GITHUB_REPOS_PER_MESSAGE") or "5")
     # get all repos for each org and add them to the queue
     for org in org_list.split(","):
-        repo_list = ghv3.get_repos(org.strip())
-        for repo in repo_list:
-            sqs_client.send_message(QueueUrl=sqs_url, MessageBody=repo["full_name"])
-    print(f"TriggerGitHubDataPullComplete {date}")
+        org = org.strip()
+        if checkpoint is not None and checkpoint.is_done("queued", org):
+            print(f"{org} was already queued today, skipping it.")
+            continue
+        if deadline.expired():
+            print(f"Out of time, {org} and the orgs after it were not queued.")
+            break
+        repos = ghv4.inventory.repos(org)
+        entries = [repo["nameWithOwner"] for repo in repos]
+        scheduler = get_scheduler()
+        if scheduler is not None:
+            # only what is due today, repos with nothing due aren't queued
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                due = list(pool.map(partial(scheduler.due, org), repos))
+            entries = [
+                {"repo": repo["nameWithOwner"], "kinds": sorted(kinds)}
+                for repo, kinds in zip(repos, due)
+                if kinds
+            ]
+            get_metrics().increment("ReposSkipped", len(repos) - len(entries))
+        bodies = [
+            json.dumps(entries[start : start + chunk_size])
+            for start in range(0, len(entries), chunk_size)
+        ]
+        unsent = send_messages(sqs_client, sqs_url, bodies)
+        get_metrics().increment("ReposQueued", len(entries))
+        get_metrics().increment("MessagesUnsent", len(unsent))
+        if unsent:
+            print(f"Failed to queue {len(unsent)} messages: {', '.join(unsent)}")
+        elif checkpoint is not None:
+            checkpoint.mark_done("queued", org)
+    print(f"TriggerGitHubDataPullComplete {date} in {time.time() - started:.3f}s")
+    flush_metrics()
     return {
         "statusCode": 200,
         "headers": {"Content-Type": "text/plain"},
@@ -62,31 +331,107 @@ def github_repo_handler(event, context):
 
 def github_data_handler(event, context):
     """
-    Triggered by a CloudWatch monitor and pulls data to act on from an SQS queue
+    Triggered by a CloudWatch monitor and pulls data to act on from an SQS queue.
+    Records are processed concurrently and the ones that failed are reported
+    back as batchItemFailures so SQS redelivers only those once their
+    visibility timeout runs out.
     """
-    # secrets manager setup
-    secrets_client = boto3.client(
-        service_name="secretsmanager", region_name="us-west-2"
-    )
-    # sqs setup
-    sqs_client = boto3.client(service_name="sqs", region_name="us-west-2")
-    sqs_url = get_sqs_url(sqs_client)
-    secret_data = secrets_client.get_secret_value(SecretId="OSS-Datastore-GitHub-Token")
-    secret_token = json.loads(secret_data["SecretString"])
-    secret = secret_token["OSS-Datastore-GitHub-Token"]
+    started = time.time()
+    ghv3, ghv4 = get_clients()
+    state_store = get_state_store()
+    log_start("GitHubDataPull", started)
+    deadline = Deadline(context)
+    workers = int(os.getenv("GITHUB_RECORD_WORKERS") or "4")
+
+    def save_progress(record, done):
+        if state_store is not None and done:
+            state_store.put(f"messages/{record['messageId']}", done)
 
-    ghv3 = ghv3_api(secret)
-    ghv4 = ghv4_api(secret)
+    def process(record):
+        """
+        Collect every repo in the record, skipping repos an earlier delivery
+        of the same message already stored
+        Returns: (True if every repo was stored or is held, names of the repos
+                 held by the stats scheduler until their stats are ready,
+                 names of the repos stored)
+        """
+        done = []
+        held = []
+        if state_store is not None:
+            done = state_store.get(f"messages/{record['messageId']}") or []
+        for full_name, kinds in repos_in_message(record["body"]):
+            if full_name in done:
+                continue
+            if deadline.expired():
+                print(f"Not enough time left for {full_name}, leaving it queued.")
+                return False, held, done
+            org, repo = full_name.split("/")
+            try:
+                # v4 first, a v4 failure then never leaves a v3 writer held
+                # in the stats scheduler
+                if kinds is None:
+                    ghv4.write_repo_traffic_to_s3(org, repo)
+                    ghv3.write_repo_traffic_to_s3(org, repo)
+                else:
+                    if "alerts" in kinds:
+                        ghv4.write_repo_traffic_to_s3(org, repo)
+                    rest_kinds = [kind for kind in kinds if kind != "alerts"]
+                    if rest_kinds:
+                        ghv3.write_repo_traffic_to_s3(org, repo, rest_kinds)
+            except (GitHubV3Error, GitHubV4Error) as err:
+                # the scheduler outlives the invocation, drop anything held
+                # for the repo so the redelivered message starts clean
+                ghv3.stats_scheduler.discard(full_name)
+                # SQS redelivers the message after its visibility timeout
+                print(f"Failed to get data for {full_name}. Leaving it queued.")
+                print(f"Error: {err}")
+                return False, held, done
+            if ghv3.stats_scheduler.holds(full_name):
+                # GitHub is still computing its stats, written by the drain
+                # below once every record has been worked through
+                held.append(full_name)
+                continue
+            done.append(full_name)
+            save_progress(record, done)
+        return True, held, done
 
-    event_info = event["Records"]
-    for record in event_info:
-        full_name = record["body"]
-        org, repo = record["body"].split("/")
+    def safe_process(record):
         try:
-            ghv3.write_repo_traffic_to_s3(org, repo)
-            ghv4.write_repo_traffic_to_s3(org, repo)
-        except (GitHubV3Error, GitHubV4Error) as err:
-            # if either request fails readd the to the queue
-            print(f"Failed to get data for {full_name}. Putting back in queue.")
-            print(f"Error: {err}")
-            sqs_client.send_message(QueueUrl=sqs_url, MessageBody=full_name)
+            return process(record)
+        except Exception as err:
+            print(f"Failed to process message {record['messageId']}: {err}")
+            return False, [], []
+
+    records = event["Records"]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(safe_process, records))
+    # write the traffic held back for 202 stats, waiting once for the whole
+    # batch instead of blocking a record worker per repo
+    ghv3.stats_scheduler.drain(expired=deadline.expired)
+    failures = []
+    for record, (ok, held, done) in zip(records, results):
+        written = [
+            full_name
+            for full_name in held
+            if not ghv3.stats_scheduler.holds(full_name)
+            and full_name not in ghv3.stats_scheduler.failed
+        ]
+        if len(written) < len(held):
+            print(f"Traffic of {record['messageId']} wasn't stored, leaving it queued.")
+            ok = False
+        done = done + written
+        if not ok:
+            save_progress(record, done)
+            failures.append({"itemIdentifier": record["messageId"]})
+        elif state_store is not None and done:
+            state_store.delete(f"messages/{record['messageId']}")
+    # anything still held ran out of time, it is redelivered with its message
+    ghv3.stats_scheduler.discard()
+    print(
+        f"Processed {len(records) - len(failures)}/{len(records)} messages "
+        f"in {time.time() - started:.3f}s."
+    )
+    get_metrics().increment("MessagesProcessed", len(records) - len(failures))
+    get_metrics().increment("MessagesFailed", len(failures))
+    flush_metrics()
+    return {"batchItemFailures": failures}
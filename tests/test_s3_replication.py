@@ -0,0 +1,104 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import json
+
+import boto3
+import pytest
+
+from moto import mock_aws
+
+import index
+
+SOURCE = "oss-datastore-source"
+DESTINATION = "oss-datastore-destination"
+DATE = "2020-01-01"
+# more than ten pages of list_objects_v2
+TRAFFIC_OBJECTS = 10050
+
+
+def keys(client, bucket, prefix=""):
+    return {
+        item["Key"]
+        for page in client.get_paginator("list_objects_v2").paginate(
+            Bucket=bucket, Prefix=prefix
+        )
+        for item in page.get("Contents", [])
+    }
+
+
+def last_summary(client):
+    runs = sorted(keys(client, DESTINATION, "_replication/runs/"))
+    body = client.get_object(Bucket=DESTINATION, Key=runs[-1])["Body"].read()
+    return json.loads(body)
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("GithubOrgs", "org")
+    monkeypatch.setenv("iamRole", "arn:aws:iam::123456789012:role/replication")
+    monkeypatch.setenv("SourceS3Bucket", SOURCE)
+    monkeypatch.setenv("DestinationS3Bucket", DESTINATION)
+    monkeypatch.setenv("ReplicateWorkers", "8")
+    with mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=SOURCE)
+        client.create_bucket(Bucket=DESTINATION)
+        for number in range(TRAFFIC_OBJECTS):
+            client.put_object(
+                Bucket=SOURCE,
+                Key=f"{DATE}/traffic/org-repo{number}-traffic.json",
+                Body=b"{}",
+            )
+        client.put_object(
+            Bucket=SOURCE, Key=f"{DATE}/cve/org-repo0-data.json", Body=b"{}"
+        )
+        # another org's documents are left alone
+        client.put_object(
+            Bucket=SOURCE, Key=f"{DATE}/traffic/other-repo0-traffic.json", Body=b"{}"
+        )
+        yield client
+
+
+def test_replicates_every_page_and_skips_what_was_copied(s3_client):
+    # listings follow continuation tokens past the first 1000 keys
+    objects = index.list_objects(s3_client, SOURCE, f"{DATE}/traffic/org")
+    assert len(objects) == TRAFFIC_OBJECTS
+
+    response = index.replicate({"backfill": [DATE]}, None)
+
+    assert response["statusCode"] == 200
+    copied = keys(s3_client, DESTINATION, f"{DATE}/")
+    assert len(copied) == TRAFFIC_OBJECTS + 1
+    assert f"{DATE}/traffic/org-repo{TRAFFIC_OBJECTS - 1}-traffic.json" in copied
+    assert f"{DATE}/traffic/other-repo0-traffic.json" not in copied
+    assert last_summary(s3_client)["copied"] == TRAFFIC_OBJECTS + 1
+
+    # a rerun copies only what changed since
+    s3_client.put_object(
+        Bucket=SOURCE, Key=f"{DATE}/traffic/org-repo5-traffic.json", Body=b'{"a": 1}'
+    )
+    s3_client.put_object(
+        Bucket=SOURCE, Key=f"{DATE}/repo/org-repo5-data.json", Body=b"{}"
+    )
+    response = index.replicate({"backfill": [DATE]}, None)
+
+    assert response["statusCode"] == 200
+    summary = last_summary(s3_client)
+    assert summary["copied"] == 2
+    assert summary["skipped"] == TRAFFIC_OBJECTS
+    assert summary["failed"] == 0
+    body = s3_client.get_object(
+        Bucket=DESTINATION, Key=f"{DATE}/traffic/org-repo5-traffic.json"
+    )["Body"].read()
+    assert body == b'{"a": 1}'
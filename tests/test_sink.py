@@ -0,0 +1,117 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+
+import boto3
+import pyarrow.parquet
+import pytest
+
+from botocore.exceptions import ClientError
+from functools import partial
+from moto import mock_aws
+
+from GitHub_Common import DiskSink, OutputFormat, ParquetSink, S3Sink
+from GitHub_Common.Records import traffic_records
+
+BUCKET = "oss-datastore-test"
+TRAFFIC = {
+    "referrers": [{"referrer": "github.com", "count": 3, "uniques": 2}],
+    "paths": [],
+    "views": {"count": 0, "uniques": 0, "views": []},
+    "clones": {"count": 0, "uniques": 0, "clones": []},
+}
+
+
+class FailingClient:
+    """
+    S3 client failing every put of a key containing "broken"
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def put_object(self, Key, **kwargs):
+        if "broken" in Key:
+            raise ClientError(
+                {"Error": {"Code": "InternalError", "Message": "failed"}}, "PutObject"
+            )
+        return self.client.put_object(Key=Key, **kwargs)
+
+
+@pytest.fixture
+def s3_client():
+    with mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def test_s3_sink_only_reports_stored_uploads(s3_client):
+    sink = S3Sink(
+        BUCKET,
+        s3_client=FailingClient(s3_client),
+        output_format=OutputFormat("compact", "none"),
+    )
+    stored = []
+    sink.write(
+        "2020-01-01/traffic/ok.json", {"a": 1}, on_stored=partial(stored.append, "ok")
+    )
+    sink.write(
+        "2020-01-01/traffic/broken.json",
+        {"a": 2},
+        on_stored=partial(stored.append, "broken"),
+    )
+
+    assert sink.close() == ["2020-01-01/traffic/broken.json"]
+    assert stored == ["ok"]
+
+
+def test_parquet_sink_reports_stored_once_rows_are_flushed(tmp_path):
+    sink = ParquetSink(
+        DiskSink(str(tmp_path), output_format=OutputFormat("compact", "none"))
+    )
+    stored = []
+    sink.write(
+        "2020-01-01/traffic/org-repo-traffic.json",
+        TRAFFIC,
+        partial(traffic_records, "org", "repo", TRAFFIC),
+        on_stored=partial(stored.append, "org/repo"),
+    )
+    # the JSON document is on disk but its referrer row is still buffered
+    assert stored == []
+
+    assert sink.close() == []
+    assert stored == ["org/repo"]
+
+
+def test_parquet_sink_partitions_rows_by_document_date(tmp_path):
+    sink = ParquetSink(
+        DiskSink(str(tmp_path), output_format=OutputFormat("compact", "none"))
+    )
+    # collected either side of midnight, flushed together by close()
+    for date in ("2020-01-01", "2020-01-02"):
+        sink.write(
+            f"{date}/traffic/org-repo-traffic.json",
+            TRAFFIC,
+            partial(traffic_records, "org", "repo", TRAFFIC),
+        )
+    assert sink.close() == []
+
+    for date in ("2020-01-01", "2020-01-02"):
+        files = os.listdir(tmp_path / date / "traffic" / "referrers")
+        assert len(files) == 1
+        table = pyarrow.parquet.read_table(
+            str(tmp_path / date / "traffic" / "referrers" / files[0])
+        )
+        assert table.num_rows == 1
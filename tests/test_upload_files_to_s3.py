@@ -0,0 +1,111 @@
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License").
+# You may not use this file except in compliance with the License.
+# A copy of the License is located at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# or in the "license" file accompanying this file. This file is distributed
+# on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+
+import boto3
+import pytest
+
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from datastore import upload_files_to_s3
+
+BUCKET = "oss-datastore-test"
+
+
+class FailingClient:
+    """
+    S3 client failing every upload of a key containing "broken"
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.attempts = 0
+
+    def upload_file(self, path, bucket, key, **kwargs):
+        if "broken" in key:
+            self.attempts += 1
+            raise ClientError(
+                {"Error": {"Code": "InternalError", "Message": "failed"}}, "PutObject"
+            )
+        return self.client.upload_file(path, bucket, key, **kwargs)
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+
+
+@pytest.fixture
+def s3_client(tmp_path, monkeypatch):
+    # uploads everything under ./output
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("S3_ROOT_BUCKET", BUCKET)
+    with mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def test_uploads_concurrently_and_deletes_uploaded_files(s3_client):
+    for index in range(40):
+        write_file(f"output/2020-01-01/traffic/org-repo{index}-traffic.json", 100)
+    write_file("output/2020-01-01/cve/org-repo-data.json.gz", 100)
+
+    failed = upload_files_to_s3(s3_client, workers=8)
+
+    assert failed == []
+    keys = [
+        item["Key"]
+        for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=BUCKET)
+        for item in page["Contents"]
+    ]
+    assert len(keys) == 41
+    assert "2020-01-01/traffic/org-repo0-traffic.json" in keys
+    head = s3_client.head_object(
+        Bucket=BUCKET, Key="2020-01-01/cve/org-repo-data.json.gz"
+    )
+    assert head["ContentEncoding"] == "gzip"
+    # uploaded files and the directories left empty are removed
+    assert not os.path.exists("output")
+
+
+def test_large_files_are_uploaded_in_parts(s3_client):
+    write_file("output/2020-01-01/traffic/big.json", 11 * 1024 * 1024)
+
+    failed = upload_files_to_s3(s3_client, multipart_threshold=5)
+
+    assert failed == []
+    head = s3_client.head_object(Bucket=BUCKET, Key="2020-01-01/traffic/big.json")
+    assert head["ContentLength"] == 11 * 1024 * 1024
+    # multipart ETags end in the number of parts
+    assert head["ETag"].strip('"').endswith("-3")
+    assert not os.path.exists("output/2020-01-01/traffic/big.json")
+
+
+def test_failed_uploads_are_kept_on_disk(s3_client):
+    write_file("output/2020-01-01/traffic/good.json", 100)
+    write_file("output/2020-01-01/traffic/broken.json", 100)
+    client = FailingClient(s3_client)
+
+    failed = upload_files_to_s3(client, attempts=3)
+
+    assert failed == [os.path.join("output", "2020-01-01", "traffic", "broken.json")]
+    assert client.attempts == 3
+    assert os.path.exists("output/2020-01-01/traffic/broken.json")
+    assert not os.path.exists("output/2020-01-01/traffic/good.json")
+    s3_client.head_object(Bucket=BUCKET, Key="2020-01-01/traffic/good.json")
+    with pytest.raises(ClientError):
+        s3_client.head_object(Bucket=BUCKET, Key="2020-01-01/traffic/broken.json")